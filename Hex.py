@@ -9,7 +9,13 @@ can be switched.
 
 Possible arguments:
 * "agent=name;command" or "a=name;command" specifies one agent
-with the given name, that can be run by the given command.
+with the given name, that can be run by the given command. A command
+of the form "inprocess:path/to/file.py:ClassName" runs a Python agent
+inside the engine process instead. The default agent provides
+NaiveInProcessAgent for this. A command of the form
+"fork:path/to/file.py:ClassName" starts the agent from a preloaded
+process (see src/Zygote.py), which helps agents that are slow to load;
+it works on Linux and macOS only.
 * "-verbose" or "-v" prints the progress of the game in real time.
 Use this argument to visualise the match.
 * "-print_protocol" or "-p" prints the protocol messages. It will
@@ -23,11 +29,32 @@ It will record all moves and the end state of the game. Check
 the documentation pdf for more details.
 * "-switch" or "-s" will invert the order of agents playing. Use
 this argument to quickly test your agent as Blue instead of Red.
+* "-bitboard" or "-bb" stores the board as packed bitmasks instead of
+a grid of tiles. The game itself is unchanged.
+* "-delta" offers agents the compact protocol mode. Agents that accept
+it receive CHANGE messages without the board, except for a periodic
+full-board resync.
+* "time=d" sets the time each agent has for the whole game (default
+5m), "increment=d" adds time to an agent's budget after each of its
+moves, and "move_time=d" limits every single move. A duration d is a
+number of seconds, or a number followed by "ms", "s" or "m", such as
+"500ms". "-fast" is short for "time=10s increment=100ms", for quick
+regression runs. "-cpu_clock" times moves by the CPU time the agent uses
+instead of the wall clock (Linux only).
+* "port=n" makes the engine listen on port n instead of a free port
+chosen by the OS. Agents are given the port in the HEX_PORT environment
+variable; use port=1234 for agents that cannot read it.
+
+To play games from another Python script, import run_match from
+src/Match.py, which returns the results instead of printing them.
 """
-import shlex
-import subprocess
-from sys import argv, platform
-from os.path import realpath, sep
+import sys
+from os.path import dirname, realpath, sep
+
+# the engine lives in src and imports its modules by name
+sys.path.insert(0, dirname(realpath(__file__)) + f"{sep}src")
+
+from main import main as run_main  # noqa: E402
 
 
 def extract_agents(arguments):
@@ -43,7 +70,7 @@ def extract_agents(arguments):
         if ("a=" in argument or "-agent" in argument):
             try:
                 name, cmd = argument.split("=")[1].split(";")
-                agents.append(f'"{argument}"')
+                agents.append(argument)
             except Exception:
                 print(f"Agent '{argument}' is not in correct format.")
         else:
@@ -51,43 +78,20 @@ def extract_agents(arguments):
     return (agents, other_args[1:])
 
 
-def get_main_cmd():
-    """Checks the OS to specify python or python3 and creates a relative path
-    command to src/main.py.
-    """
-
-    main_cmd = "python"
-    if (platform != "win32"):
-        main_cmd += "3"
-
-    main_path = sep.join(realpath(__file__).split(sep)[:-1])
-    main_path += f"{sep}src{sep}main.py"
-
-    main_cmd += " " + main_path
-    return main_cmd
-
-
 def main():
     """Checks that at most two agents are specified and that they
-    are unique, then runs the main script with the given args.
+    are unique, then plays the game in this process.
     """
 
-    agents, arguments = extract_agents(argv)
+    agents, arguments = extract_agents(sys.argv)
     if (len(agents)) > 2:
         print("ERROR: Too many agents specified. Aborted.")
         return
     elif (len(agents) != len(set(agents))):
         print("ERROR: Agent strings must be unique. Aborted.")
+        return
 
-    cmd = (
-        get_main_cmd() + " " +
-        " ".join(arguments) + " " +
-        " ".join(agents)
-    )
-    if (platform != "win32"):
-        cmd = shlex.split(cmd)
-
-    subprocess.run(cmd)
+    run_main([sys.argv[0]] + arguments + agents)
 
 
 if __name__ == "__main__":
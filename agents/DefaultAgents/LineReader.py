@@ -0,0 +1,33 @@
+class LineReader():
+    """Reads newline-terminated protocol messages from a socket.
+
+    A single recv may return several messages, or only part of one (for
+    example a CHANGE message on a large board). This class reads in large
+    chunks and hands out one complete line at a time, keeping whatever
+    follows for the next call.
+    """
+
+    RECEIVE_SIZE = 65536
+
+    def __init__(self, s):
+        self._s = s
+        self._buffer = bytearray()
+
+    def read_line(self):
+        """Returns the next message including its newline, or an empty
+        string once the engine has closed the connection.
+        """
+
+        while (True):
+            end = self._buffer.find(b"\n")
+            if (end != -1):
+                line = self._buffer[:end + 1].decode("utf-8")
+                del self._buffer[:end + 1]
+                return line
+
+            data = self._s.recv(LineReader.RECEIVE_SIZE)
+            if (not data):
+                line = self._buffer.decode("utf-8")
+                self._buffer.clear()
+                return line
+            self._buffer += data
@@ -5,7 +5,16 @@ import java.io.*;
 
 class NaiveAgent{
     public static String HOST = "127.0.0.1";
-    public static int PORT = 1234;
+    public static int PORT = getPort();
+
+    private static int getPort(){
+        // the engine passes its port through HEX_PORT
+        String port = System.getenv("HEX_PORT");
+        if (port == null){
+            return 1234;
+        }
+        return Integer.parseInt(port);
+    }
 
     private Socket s;
     private PrintWriter out;
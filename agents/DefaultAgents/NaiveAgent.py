@@ -1,7 +1,10 @@
+import os
 import socket
 from random import choice
 from time import sleep
 
+from LineReader import LineReader
+
 
 class NaiveAgent():
     """This class describes the default Hex agent. It will randomly send a
@@ -9,7 +12,10 @@ class NaiveAgent():
     """
 
     HOST = "127.0.0.1"
-    PORT = 1234
+    PORT = int(os.environ.get("HEX_PORT", 1234))
+
+    # optional protocol capabilities this agent accepts when offered
+    CAPABILITIES = ["DELTA", "SESSION"]
 
     def run(self):
         """A finite-state machine that cycles through waiting for input
@@ -21,13 +27,15 @@ class NaiveAgent():
         self._colour = ""
         self._turn_count = 1
         self._choices = []
+        self._session = False
         
         states = {
             1: NaiveAgent._connect,
             2: NaiveAgent._wait_start,
             3: NaiveAgent._make_move,
             4: NaiveAgent._wait_message,
-            5: NaiveAgent._close
+            5: NaiveAgent._close,
+            6: NaiveAgent._wait_new_game
         }
 
         res = states[1](self)
@@ -41,6 +49,10 @@ class NaiveAgent():
         
         self._s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self._s.connect((NaiveAgent.HOST, NaiveAgent.PORT))
+        # send short messages at once; otherwise a move sent right after
+        # an ACK waits for the engine's delayed ACK
+        self._s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = LineReader(self._s)
 
         return 2
 
@@ -49,14 +61,29 @@ class NaiveAgent():
         answers if it is Red or waits if it is Blue.
         """
         
-        data = self._s.recv(1024).decode("utf-8").strip().split(";")
+        data = self._reader.read_line().strip().split(";")
         if (data[0] == "START"):
             self._board_size = int(data[1])
+            self._turn_count = 1
+            self._choices = []
             for i in range(self._board_size):
                 for j in range(self._board_size):
                     self._choices.append((i, j))
             self._colour = data[2]
 
+            # the board is never read, so accept the compact protocol;
+            # nothing carries over between games, so accept sessions too
+            accepted = []
+            if (len(data) > 3):
+                accepted = [
+                    capability for capability in data[3].split(",")
+                    if capability in NaiveAgent.CAPABILITIES
+                ]
+            if (len(accepted) > 0):
+                msg = "ACK;" + ",".join(accepted) + "\n"
+                self._s.sendall(bytes(msg, "utf-8"))
+            self._session = "SESSION" in accepted
+
             if (self._colour == "R"):
                 return 3
             else:
@@ -86,8 +113,10 @@ class NaiveAgent():
 
         self._turn_count += 1
 
-        data = self._s.recv(1024).decode("utf-8").strip().split(";")
+        data = self._reader.read_line().strip().split(";")
         if (data[0] == "END" or data[-1] == "END"):
+            if (self._session):
+                return 6
             return 5
         else:
 
@@ -102,6 +131,20 @@ class NaiveAgent():
 
         return 4
 
+    def _wait_new_game(self):
+        """In a session, waits after the end of a game to learn whether
+        another one follows. The engine closes the connection if not.
+        """
+
+        data = self._reader.read_line().strip()
+        if (data == "END" or data.startswith("END;")):
+            # the END message that follows the final CHANGE
+            return 6
+        elif (data == "NEWGAME"):
+            return 2
+        else:
+            return 5
+
     def _close(self):
         """Closes the socket."""
 
@@ -121,6 +164,38 @@ class NaiveAgent():
             return "None"
 
 
+class NaiveInProcessAgent():
+    """The default agent's strategy for in-process games. The engine calls
+    these methods directly instead of exchanging messages over a socket;
+    see src/InProcessAgent.py.
+    """
+
+    def start(self, board_size, colour):
+        self._colour = colour
+        self._turn_count = 1
+        self._choices = [
+            (i, j) for i in range(board_size) for j in range(board_size)
+        ]
+
+    def on_change(self, move, next_player):
+        self._turn_count += 1
+
+        if (move == (-1, -1)):
+            self._colour = "B" if self._colour == "R" else "R"
+        else:
+            self._choices.remove(move)
+
+    def get_move(self):
+        """Returns a random valid move, or a swap with a coinflip."""
+
+        if (self._turn_count == 2 and choice([0, 1]) == 1):
+            return (-1, -1)
+        return choice(self._choices)
+
+    def end(self, winner):
+        pass
+
+
 if (__name__ == "__main__"):
     agent = NaiveAgent()
     agent.run()
@@ -1,10 +1,11 @@
+import os
 import socket
 from time import sleep
 
 
 def main():
     HOST = "127.0.0.1"
-    PORT = 1234
+    PORT = int(os.environ.get("HEX_PORT", 1234))
 
     MAX_SIZE_MESSAGE_B = 1024
 
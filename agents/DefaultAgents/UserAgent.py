@@ -1,7 +1,10 @@
+import os
 import socket
 from random import choice
 from time import sleep
 
+from LineReader import LineReader
+
 
 class NaiveAgent():
     """This class describes the default Hex agent. It will randomly send a
@@ -9,7 +12,7 @@ class NaiveAgent():
     """
 
     HOST = "127.0.0.1"
-    PORT = 1234
+    PORT = int(os.environ.get("HEX_PORT", 1234))
 
     def run(self):
         """A finite-state machine that cycles through waiting for input
@@ -41,6 +44,10 @@ class NaiveAgent():
         
         self._s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self._s.connect((NaiveAgent.HOST, NaiveAgent.PORT))
+        # send short messages at once; otherwise a move sent right after
+        # an ACK waits for the engine's delayed ACK
+        self._s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = LineReader(self._s)
 
         return 2
 
@@ -49,7 +56,7 @@ class NaiveAgent():
         answers if it is Red or waits if it is Blue.
         """
         
-        data = self._s.recv(1024).decode("utf-8").strip().split(";")
+        data = self._reader.read_line().strip().split(";")
         if (data[0] == "START"):
             self._board_size = int(data[1])
             for i in range(self._board_size):
@@ -57,6 +64,10 @@ class NaiveAgent():
                     self._choices.append((i, j))
             self._colour = data[2]
 
+            # the board is never read, so accept the compact protocol
+            if (len(data) > 3 and "DELTA" in data[3].split(",")):
+                self._s.sendall(bytes("ACK;DELTA\n", "utf-8"))
+
             if (self._colour == "R"):
                 return 3
             else:
@@ -101,7 +112,7 @@ class NaiveAgent():
 
         self._turn_count += 1
 
-        data = self._s.recv(1024).decode("utf-8").strip().split(";")
+        data = self._reader.read_line().strip().split(";")
         if (data[0] == "END" or data[-1] == "END"):
             return 5
         else:
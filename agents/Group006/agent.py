@@ -1,5 +1,7 @@
+import os
 import socket
 from skynet import Skynet
+from linereader import LineReader
 
 
 class SkynetAgent():
@@ -8,34 +10,48 @@ class SkynetAgent():
     """
 
     HOST = "127.0.0.1"
-    PORT = 1234
+    PORT = int(os.environ.get("HEX_PORT", 1234))
 
     COLOUR_MAP = {"R": 1, "B": -1}
     OPP_COLOUR = {"R": "B", "B": "R"}
+    CAPABILITIES = ["DELTA", "SESSION"]
 
     def __init__(self, board_size=11):
         self.s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.s.connect((self.HOST, self.PORT))
+        # send short messages at once; otherwise a move sent right after an ACK waits for the engine's delayed ACK
+        self.s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = LineReader(self.s)
 
         self.board_size = board_size
         self.board = []
         self.colour = ""
+        self.session = False
 
         self.skynet = Skynet()
 
+    @staticmethod
+    def preload():
+        """
+        Load the networks before the first game, so that agents forked from a zygote (see src/Zygote.py) share them.
+        """
+        Skynet.preload()
+
     def run(self):
         """
-        Read data until it receives an END message or the socket closes.
+        Read messages until it receives an END message or the socket closes.
+        In a session, END is followed by NEWGAME and the next START, or the socket is closed when no game follows.
         """
 
         while True:
-            data = self.s.recv(1024)
+            data = self.reader.read_line()
             if not data:
                 break
             # print(f"{self.colour} {data.decode('utf-8')}", end="")
             if self.interpret_data(data):
                 break
 
+        self.skynet.stop_pondering()
         self.s.close()
         # print(f"Naive agent {self.colour} terminated")
 
@@ -45,7 +61,7 @@ class SkynetAgent():
         Return True if the game ended, False otherwise.
         """
 
-        messages = data.decode("utf-8").strip().split("\n")
+        messages = data.strip().split("\n")
         messages = [x.split(";") for x in messages]
         # print(messages)
         for s in messages:
@@ -53,16 +69,33 @@ class SkynetAgent():
                 self.board_size = int(s[1])
                 self.colour = s[2]
                 self.board = [[0] * self.board_size for _ in range(self.board_size)]
+                if self.session:
+                    # the networks stay loaded, only the search starts over
+                    self.skynet = Skynet()
+
+                # the board is tracked locally, so accept the compact protocol;
+                # sessions keep the networks loaded between games
+                accepted = []
+                if len(s) > 3:
+                    accepted = [x for x in s[3].split(",") if x in self.CAPABILITIES]
+                if accepted:
+                    self.s.sendall(bytes("ACK;" + ",".join(accepted) + "\n", "utf-8"))
+                self.session = "SESSION" in accepted
 
                 if self.colour == "R":
                     self.make_move()
 
             elif s[0] == "END":
-                return True
+                self.skynet.stop_pondering()
+                return not self.session
+
+            elif s[0] == "NEWGAME":
+                continue
 
             elif s[0] == "CHANGE":
                 if s[3] == "END":
-                    return True
+                    self.skynet.stop_pondering()
+                    return not self.session
 
                 elif s[1] == "SWAP":
                     self.colour = self.OPP_COLOUR[self.colour]
@@ -91,6 +124,48 @@ class SkynetAgent():
             self.s.sendall(bytes(f"{x},{y}\n", "utf-8"))
             self.board[x][y] = self.COLOUR_MAP[self.colour]
             self.skynet.make_move((x, y))
+            # think on the opponent's time; stopped by the next make_move or the end of the game
+            self.skynet.ponder()
+
+
+class SkynetInProcessAgent:
+    """
+    The Skynet hex agent for in-process games, driven directly by the engine instead of over a socket.
+    See src/InProcessAgent.py for the interface.
+    It does not ponder: the opponent's turn runs in the same process, so a background search would take its CPU time.
+    """
+
+    COLOUR_MAP = SkynetAgent.COLOUR_MAP
+    OPP_COLOUR = SkynetAgent.OPP_COLOUR
+
+    def start(self, board_size, colour):
+        self.board_size = board_size
+        self.colour = colour
+        self.board = [[0] * self.board_size for _ in range(self.board_size)]
+        self.skynet = Skynet()
+
+    def on_change(self, move, next_player):
+        """
+        Record a move. Own moves are already recorded in get_move.
+        """
+        if move == (-1, -1):
+            self.colour = self.OPP_COLOUR[self.colour]
+        elif next_player == self.colour:
+            self.board[move[0]][move[1]] = self.COLOUR_MAP[self.OPP_COLOUR[self.colour]]
+            self.skynet.make_move(move)
+
+    def get_move(self):
+        """
+        Decide a move by predictor.
+        """
+        x, y = self.skynet.next_move(self.board, red_turn=(self.colour == "R"))
+        if x != -1:
+            self.board[x][y] = self.COLOUR_MAP[self.colour]
+            self.skynet.make_move((x, y))
+        return (x, y)
+
+    def end(self, winner):
+        pass
 
 
 if __name__ == "__main__":
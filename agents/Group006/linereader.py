@@ -0,0 +1,30 @@
+class LineReader:
+    """
+    Read newline-terminated protocol messages from a socket.
+    """
+    RECEIVE_SIZE = 65536
+
+    def __init__(self, s):
+        self.s = s
+        self.buffer = bytearray()
+
+    def read_line(self):
+        """
+        Return the next message including its newline.
+        One recv may carry several messages or only part of one (e.g. a large board), so extra data is kept for the next call.
+
+        Output: message string, or "" once the socket is closed
+        """
+        while True:
+            end = self.buffer.find(b"\n")
+            if end != -1:
+                line = self.buffer[:end + 1].decode("utf-8")
+                del self.buffer[:end + 1]
+                return line
+
+            data = self.s.recv(self.RECEIVE_SIZE)
+            if not data:
+                line = self.buffer.decode("utf-8")
+                self.buffer.clear()
+                return line
+            self.buffer += data
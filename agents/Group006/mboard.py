@@ -0,0 +1,149 @@
+from zobrist import ZobristHash
+
+
+class MBoard:
+    """
+    The board the MCTS explorer searches on: one mutable list-of-lists board (1 for Red, -1 for Blue, 0 for empty) with a move stack.
+    Stones are placed with play and taken back with undo, so a simulation returns to the root position in O(moves played) instead of copying the board.
+    Connected groups are kept in a union-find with a virtual node per side that is rolled back with the stones, so checking for a win costs O(log n) instead of a DFS over the board.
+    """
+
+    NEIGHBOURS = [(-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0)]
+
+    def __init__(self, board):
+        self.size = len(board)
+        self.board = [[0] * self.size for _ in range(self.size)]
+        self.zobrist = ZobristHash(self.size)
+
+        # union-find over the tiles x*n + y, then the top, bottom, left and right sides
+        n = self.size * self.size
+        self.parent = list(range(n + 4))
+        self.rank = [0] * (n + 4)
+        self.sides = {1: (n, n + 1), -1: (n + 2, n + 3)}
+        self.unions = []  # (child root, whether the parent's rank grew)
+        self.stack = []  # (move, number of unions before it)
+
+        for x in range(self.size):
+            for y in range(self.size):
+                if board[x][y] != 0:
+                    self.place(x, y, board[x][y])
+
+    def __len__(self):
+        """
+        The number of moves that undo can take back.
+        """
+        return len(self.stack)
+
+    def find(self, node):
+        # no path compression, so that unions can be undone
+        while self.parent[node] != node:
+            node = self.parent[node]
+        return node
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return
+        if self.rank[a] < self.rank[b]:
+            a, b = b, a
+        self.parent[b] = a
+        grew = self.rank[a] == self.rank[b]
+        if grew:
+            self.rank[a] += 1
+        self.unions.append((b, grew))
+
+    def place(self, x, y, player):
+        """
+        Put a stone on the board and join it to its groups and sides, without recording it for undo.
+        """
+        n = self.size
+        self.board[x][y] = player
+        self.zobrist.toggle(x, y, player)
+        node = x * n + y
+        first, last = self.sides[player]
+        if player == 1:
+            line = x
+        else:
+            line = y
+        if line == 0:
+            self.union(node, first)
+        if line == n - 1:
+            self.union(node, last)
+        for dx, dy in self.NEIGHBOURS:
+            x_n, y_n = x + dx, y + dy
+            if 0 <= x_n < n and 0 <= y_n < n and self.board[x_n][y_n] == player:
+                self.union(node, x_n * n + y_n)
+
+    def play(self, move, player):
+        """
+        Place a stone for the player, so that undo can take it back.
+        """
+        x, y = move
+        if self.board[x][y] != 0:
+            raise ValueError("Cell occupied")
+        self.stack.append((move, len(self.unions)))
+        self.place(x, y, player)
+
+    def undo(self):
+        """
+        Take back the last move played.
+        """
+        (x, y), checkpoint = self.stack.pop()
+        self.zobrist.toggle(x, y, self.board[x][y])
+        self.board[x][y] = 0
+        while len(self.unions) > checkpoint:
+            b, grew = self.unions.pop()
+            a = self.parent[b]
+            self.parent[b] = b
+            if grew:
+                self.rank[a] -= 1
+
+    def undo_to(self, depth):
+        """
+        Take back moves until only the given number of them are left.
+        """
+        while len(self.stack) > depth:
+            self.undo()
+
+    def has_ended(self, player):
+        """
+        Check whether the player has connected their sides.
+        """
+        first, last = self.sides[player]
+        return self.find(first) == self.find(last)
+
+    def fill_winner(self, moves, player):
+        """
+        Fill the given empty cells in order, alternating from the player, and return the winner of the full board.
+        The cells are emptied again afterwards; the union-find and the move stack are never touched.
+        Hex has no draws, so exactly one player connects on a full board, and it is the one who would have connected first had the moves been played one by one.
+        """
+        board = self.board
+        for x, y in moves[0::2]:
+            board[x][y] = player
+        for x, y in moves[1::2]:
+            board[x][y] = -player
+        winner = 1 if self.red_connected() else -1
+        for x, y in moves:
+            board[x][y] = 0
+        return winner
+
+    def red_connected(self):
+        """
+        Check whether Red connects top and bottom, with one search from the top row.
+        """
+        board, n = self.board, self.size
+        stack = [(0, y) for y in range(n) if board[0][y] == 1]
+        visited = [[False] * n for _ in range(n)]
+        for x, y in stack:
+            visited[x][y] = True
+        while stack:
+            x, y = stack.pop()
+            if x == n - 1:
+                return True
+            for dx, dy in self.NEIGHBOURS:
+                x_n, y_n = x + dx, y + dy
+                if 0 <= x_n < n and 0 <= y_n < n and not visited[x_n][y_n] and board[x_n][y_n] == 1:
+                    visited[x_n][y_n] = True
+                    stack.append((x_n, y_n))
+        return False
@@ -1,7 +1,16 @@
+import os
+import sys
 import random
 import time
-import copy
+import threading
+import multiprocessing
 from mnode import Node
+from mboard import MBoard
+try:
+    from mrollout import BatchRollout
+except ImportError:
+    # without NumPy, playouts run one at a time
+    BatchRollout = None
 from utils import print_board
 from ppredictor import PolicyPredictor
 
@@ -9,27 +18,68 @@ from ppredictor import PolicyPredictor
 class MCTSExplorer:
     TIME_BUDGET = 9
     POLICY_CANDIDATES = 10
+    # fill the board at random and judge it once, instead of checking for a win after every stone; same outcomes, far cheaper
+    FILL_PLAYOUTS = True
+    # playouts run at once per leaf with NumPy, backed up as one visit worth their mean outcome; 0 or 1 for one pure-Python playout per leaf
+    ROLLOUT_BATCH = 32
+    # processes searching each move, this one included; set SKYNET_WORKERS to use more cores
+    WORKERS = int(os.environ.get("SKYNET_WORKERS", 1))
+    # seconds to wait past the deadline for the other processes to finish their last simulations
+    WORKER_GRACE = 0.25
+    # leaves expanded together with one call to the policy network
+    EVAL_BATCH = 8
+    # visits counted as losses on the path to a leaf waiting for the network
+    VIRTUAL_LOSS = 1
+
+    # the other WORKERS - 1 processes, started once per process (see get_pool) and kept for the rest of it
+    pool = None
+
+    # loaded once per process, like Skynet.value_predictor
+    policy_predictor = None
 
     def __init__(self, board, to_play):
-        self.root_state = copy.deepcopy(board)
+        # the only board searched on; simulations play on it and undo their moves
+        self.root_state = MBoard(board)
+        self.batch_rollout = None
+        if BatchRollout is not None and self.ROLLOUT_BATCH > 1:
+            self.batch_rollout = BatchRollout(len(board))
         self.root_node = Node(to_play)
-        self.predictor = PolicyPredictor()
+        self.predictor = self.load_policy_predictor()
+        # other processes' statistics added to the root's children: move -> (times, reward)
+        self.merged = {}
+
+        # background search during the opponent's turn
+        self.ponder_thread = None
+        self.ponder_stop = threading.Event()
+
+    @classmethod
+    def load_policy_predictor(cls):
+        if cls.policy_predictor is None:
+            cls.policy_predictor = PolicyPredictor()
+        return cls.policy_predictor
 
     def make_move(self, move):
         """
         Make a move on the real chess board and update the root of the tree.
         """
+        self.stop_pondering()
         move = tuple(move)
-        self.root_node = self.root_node.children.get(move, Node(self.root_node.player))
+        node = self.root_node.children.get(move, Node(self.root_node.player))
+        # the other processes' statistics only served to choose this move; the kept subtree must match its own visits
+        times, reward = self.merged.get(move, (0, 0))
+        node.times -= times
+        node.reward -= reward
+        self.merged = {}
+        self.root_node = node
         self.root_node.parent = None
-        self.play(self.root_state, move, self.root_node.player)
+        self.root_state.play(move, self.root_node.player)
 
     def best_move(self):
         """
         Return the current best move based on performed searching.
         """
         # Return None if the game is over
-        if self.has_ended(self.root_state, self.root_node.player):
+        if self.root_state.has_ended(self.root_node.player):
             return None
         # choose the move of the most simulated node breaking ties randomly
         max_value = max(self.root_node.children.values(), key=lambda n: n.times).times
@@ -37,53 +87,230 @@ class MCTSExplorer:
         bestchild = random.choice(max_nodes)
         return bestchild.move
 
-    def search(self):
+    def search(self, time_budget=None, stop=None):
+        """
+        Search and update the search tree for a specified amount of time in seconds (TIME_BUDGET by default), or until the stop event is set.
+        With WORKERS > 1, the other processes search from the same root at the same time (root parallelisation) and their statistics for the root's children are added to this tree.
+        Searches with a stop event, i.e. pondering, stay in this process, and so do searches in processes that cannot start others.
+
+        Output: number of playouts performed
+        """
+        if time_budget is None:
+            time_budget = self.TIME_BUDGET
+        if self.WORKERS > 1 and stop is None and self.get_pool() is not None:
+            return self.search_parallel(time_budget)
+        return self.search_alone(time_budget, stop)
+
+    @classmethod
+    def get_pool(cls):
+        """
+        Return the pool of the other WORKERS - 1 processes, starting it on first use, or None if this process cannot start it.
+        Skynet starts it before its first search, as the workers take a while to load the policy network.
+        """
+        if cls.pool is None:
+            # daemonic processes, such as the tournament's game workers running an in-process agent, may not have children
+            if multiprocessing.current_process().daemon:
+                return None
+            # never fork this process: forking after torch has started its threads can deadlock the child
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context("forkserver")
+            else:
+                context = multiprocessing.get_context("spawn")
+            try:
+                cls.pool = context.Pool(cls.WORKERS - 1, initializer=load_worker)
+            except (OSError, AssertionError):
+                # search alone for the rest of the process
+                cls.WORKERS = 1
+                return None
+        return cls.pool
+
+    def search_parallel(self, time_budget):
+        """
+        Search in this process and in WORKERS - 1 others, each with its own tree from the root, and merge the root statistics.
+
+        Output: number of playouts performed by all processes
+        """
+        # the monotonic clock is shared by all processes, so they all stop together
+        deadline = time.monotonic() + time_budget
+        # copied now, as this process changes the board while the jobs are sent
+        board = [row[:] for row in self.root_state.board]
+        jobs = []
+        for _ in range(self.WORKERS - 1):
+            try:
+                jobs.append(self.get_pool().apply_async(search_from_root, (board, self.root_node.to_play, deadline)))
+            except Exception:
+                break
+        num_simulation = self.search_alone(time_budget)
+        # late workers must not push the move past its time
+        wait_until = deadline + self.WORKER_GRACE
+        for job in jobs:
+            try:
+                stats, playouts = job.get(timeout=max(wait_until - time.monotonic(), 0))
+            except Exception:
+                # a failed or late worker only costs its share of the search
+                continue
+            self.merge_root(stats)
+            num_simulation += playouts
+        return num_simulation
+
+    def merge_root(self, stats):
         """
-        Search and update the search tree for a specified amount of time in seconds.
+        Add another process's statistics for the root's children to this tree.
+        They are recorded in merged, so that make_move can take them out of the child that becomes the root.
 
-        Output: number of simulations performed
+        Input: dictionary from move to (times, reward)
         """
-        start_time = time.time()
+        for move, (times, reward) in stats.items():
+            child = self.root_node.children.get(move)
+            if child is None:
+                child = Node(self.root_node.player, move, self.root_node)
+                self.root_node.add_child(child)
+            child.times += times
+            child.reward += reward
+            self.root_node.times += times
+            merged_times, merged_reward = self.merged.get(move, (0, 0))
+            self.merged[move] = (merged_times + times, merged_reward + reward)
+
+    def search_alone(self, time_budget, stop=None):
+        """
+        Run simulations in this process only, for the given time in seconds or until the stop event is set.
+
+        Output: number of playouts performed
+        """
+        start_time = time.monotonic()
+        num_simulation = 0
+        while time.monotonic() - start_time < time_budget:
+            if stop is not None and stop.is_set():
+                break
+            num_simulation += self.simulate_batch()
+        return num_simulation
+
+    def simulate_batch(self):
+        """
+        Select up to EVAL_BATCH leaves, expand them all with one call to the policy network, then run and back up the playouts of each.
+        While a leaf waits for the network, a virtual loss on its path steers the next selections to other paths; selection stops early if it reaches a waiting leaf again.
+        Finished games need no network, so their leaves are backed up straight away.
+
+        Output: number of playouts performed
+        """
+        state = self.root_state
+        depth = len(state)
         num_simulation = 0
-        while time.time() - start_time < self.TIME_BUDGET:
-            node, state = self.select_node()
-            outcome = self.simulation(state, node.to_play)
-            self.backup(node, node.to_play, outcome)
-            num_simulation += 1
+        pending = []  # (leaf, its board)
+        waiting = set()
+        for _ in range(max(self.EVAL_BATCH, 1)):
+            node = self.select_node()
+            if state.has_ended(node.player):
+                outcomes = self.rollout(state, node.to_play)
+                self.backup(node, node.to_play, outcomes)
+                num_simulation += len(outcomes)
+            elif node in waiting:
+                state.undo_to(depth)
+                break
+            else:
+                pending.append((node, [row[:] for row in state.board]))
+                waiting.add(node)
+                self.add_virtual_loss(node, self.VIRTUAL_LOSS)
+            # back to the root position
+            state.undo_to(depth)
+
+        if not pending:
+            return num_simulation
+        # find out possible moves from policy predictor, for all the leaves at once
+        candidates = self.predictor.next_moves(
+            [board for _, board in pending], [node.to_play == 1 for node, _ in pending], k=self.POLICY_CANDIDATES
+        )
+        for (node, _), moves in zip(pending, candidates):
+            self.add_virtual_loss(node, -self.VIRTUAL_LOSS)
+            self.expand(node, moves)
+            # play the path to the leaf again, then one of its new children
+            self.play_path(node)
+            node = random.choice(list(node.children.values()))
+            state.play(node.move, node.player)
+            outcomes = self.rollout(state, node.to_play)
+            self.backup(node, node.to_play, outcomes)
+            state.undo_to(depth)
+            num_simulation += len(outcomes)
         return num_simulation
 
+    def add_virtual_loss(self, node, times):
+        """
+        Count visits without reward on the path from the passed node to root, which makes the path look worse to the player choosing each node of it; a negative number takes them back.
+        """
+        while node is not None:
+            node.times += times
+            node = node.parent
+
+    def play_path(self, node):
+        """
+        Play the moves from the root to the passed node on the root board.
+        """
+        path = []
+        while node.parent is not None:
+            path.append(node)
+            node = node.parent
+        for node in reversed(path):
+            self.root_state.play(node.move, node.player)
+
+    def start_pondering(self):
+        """
+        Keep searching from the current root in a background thread while the opponent thinks.
+        The tree grows under every possible reply, so the part under the actual reply is kept by make_move.
+        """
+        self.stop_pondering()
+        self.ponder_stop.clear()
+        self.ponder_thread = threading.Thread(
+            target=self.search, kwargs={"time_budget": float("inf"), "stop": self.ponder_stop}, daemon=True
+        )
+        self.ponder_thread.start()
+
+    def stop_pondering(self):
+        """
+        Stop the background search, waiting for the current simulation to finish, so that the tree can be changed safely.
+        """
+        if self.ponder_thread is not None:
+            self.ponder_stop.set()
+            self.ponder_thread.join()
+            self.ponder_thread = None
+
     def select_node(self):
         """
-        This function search through the MCTS tree and expand children for one leaf node.
+        This function search through the MCTS tree for one leaf node, playing the moves on the way on the root board.
 
-        Output: Node, current board situation for the node
+        Output: the leaf node, which is still to be expanded unless its game has ended
         """
         node = self.root_node
-        state = copy.deepcopy(self.root_state)
+        state = self.root_state
         # pick the most urgent child until reach a leaf node
         while node.children:
             max_value = max(node.children.values(), key=lambda n: n.update_value()).value
             max_nodes = [n for n in node.children.values() if n.value == max_value]
             node = random.choice(max_nodes)
-            self.play(state, node.move, node.player)
-        # if we reach a leaf node generate its children and return one of them
-        # if the node is terminal, just return the terminal node
-        if not self.has_ended(state, node.player):
-            self.expand(node, state)
-            node = random.choice(list(node.children.values()))
-            self.play(state, node.move, node.player)
-        return node, state
+            state.play(node.move, node.player)
+        return node
 
-    def expand(self, node, state):
+    def expand(self, node, moves):
         """
-        Generate the children of the passed leaf node based on the available moves in the passed game state and add them to the tree.
+        Generate the children of the passed leaf node for the moves suggested by the policy predictor and add them to the tree.
 
-        Input : leaf node to expand, the board state for the node
+        Input : leaf node to expand, the candidate moves
         """
-        # find out possible moves from policy predictor
-        for move in self.predictor.next_move(state, (node.to_play == 1), k=self.POLICY_CANDIDATES):
+        for move in moves:
             node.add_child(Node(node.player, move, node))
 
+    def rollout(self, state, to_play):
+        """
+        Run the playouts for a leaf: ROLLOUT_BATCH of them at once if NumPy is available, otherwise one simulation.
+
+        Input : current board state, next player to place the chess piece
+        Output : list of winners
+        """
+        if self.batch_rollout is None:
+            return [self.simulation(state, to_play)]
+        if state.has_ended(-to_play):
+            return [-to_play]
+        return self.batch_rollout.run(state.board, to_play, self.ROLLOUT_BATCH).tolist()
+
     def simulation(self, state, to_play):
         """
         Simulate the possible moves for current board state until one of the player wins.
@@ -91,24 +318,27 @@ class MCTSExplorer:
         Input : current board state, next player to place the chess piece
         Output : winner
         """
-        if self.has_ended(state, -to_play):
+        if state.has_ended(-to_play):
             return -to_play
-        moves = self.get_available_moves(state)
+        moves = self.get_available_moves(state.board)
         random.shuffle(moves)
+        if self.FILL_PLAYOUTS:
+            return state.fill_winner(moves, to_play)
         for move in moves:
-            self.play(state, move, to_play)
+            state.play(move, to_play)
             to_play *= -1
-            if self.has_ended(state, -to_play):
+            if state.has_ended(-to_play):
                 return -to_play
 
-    def backup(self, node, to_play, outcome):
+    def backup(self, node, to_play, outcomes):
         """
-        Update the node statistics on the path from the passed node to root to reflect the outcome of a randomly simulated playout.
+        Update the node statistics on the path from the passed node to root to reflect the outcomes of randomly simulated playouts, all in one pass.
+        The playouts of a leaf count as one visit worth the fraction of them won, so that a batch weighs as much as a single playout in the UCT values.
 
-        Input: the leaf node to start the backup from, the color to play at the leaf, the simulation outcome (winner color)
+        Input: the leaf node to start the backup from, the color to play at the leaf, the simulation outcomes (winner colors)
         """
         # reward is calculated for player who just played at the node and not the next player to play
-        reward = 0 if outcome == to_play else 1
+        reward = (len(outcomes) - outcomes.count(to_play)) / len(outcomes)
         while node is not None:
             node.times += 1
             node.reward += reward
@@ -130,70 +360,45 @@ class MCTSExplorer:
                     moves.append((i, j))
         return moves
 
-    def play(self, board, move, to_play):
-        """
-        Place a move for the player on current board
 
-        Input: current board state, move tuple, player
-        Output: Updated board state
-        """
-        if board[move[0]][move[1]] == 0:  # Check whether the cell is occupied
-            board[move[0]][move[1]] = to_play
-        else:
-            raise ValueError("Cell occupied")
+def load_worker():
+    """
+    Load the policy network once in each worker process, before its first search.
+    """
+    MCTSExplorer.load_policy_predictor()
 
-    def has_ended(self, board, player):
-        """
-        Check if current board state has winning route for last played player
 
-        Input: current board state, current player
-        Output: boolean
-        """
-        rows, cols = len(board), len(board[0])
-        visited = [[False] * cols for _ in range(rows)]
-        if player == 1:
-            # iterate over first row
-            for j in range(cols):
-                if not visited[0][j] and board[0][j] == player:
-                    if self.dfs_ended(0, j, board, visited, player):
-                        return True
-        else:
-            # iterate over first column
-            for i in range(rows):
-                if not visited[i][0] and board[i][0] == player:
-                    if self.dfs_ended(i, 0, board, visited, player):
-                        return True
-        return False
+def search_from_root(board, to_play, deadline):
+    """
+    Search from the given position in a worker process until the deadline on the monotonic clock.
 
-    def dfs_ended(self, x, y, board, visited, player):
-        """"
-        A recursive DFS that iterates through connected tiles of player's colour until it reaches bottom/right on a board.
+    Output: dictionary from each move at the root to its (times, reward), number of playouts performed
+    """
+    explorer = MCTSExplorer(board, to_play)
+    num_simulation = explorer.search_alone(deadline - time.monotonic())
+    return {move: (child.times, child.reward) for move, child in explorer.root_node.children.items()}, num_simulation
 
-        Output: boolean
-        """
-        rows, cols = len(board), len(board[0])
-        if player == 1:
-            # if reach the bottom, return True
-            if x == rows - 1:
-                return True
-        else:
-            # if reach the right, return True
-            if y == cols - 1:
-                return True
-        visited[x][y] = True
-        # visit neighbours
-        neighbours = [(-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0)]
-        for dx, dy in neighbours:
-            x_n = x + dx
-            y_n = y + dy
-            if x_n >= 0 and x_n < rows and y_n >= 0 and y_n < cols:
-                if not visited[x_n][y_n] and board[x_n][y_n] == player:
-                    if self.dfs_ended(x_n, y_n, board, visited, player):
-                        return True
-        return False
+
+def benchmark(time_budget):
+    """
+    Time the search of the empty board with the WORKERS processes set by SKYNET_WORKERS, e.g. to compare SKYNET_WORKERS=1 and SKYNET_WORKERS=4 on the same machine.
+    """
+    explorer = MCTSExplorer([[0] * 11 for _ in range(11)], to_play=1)
+    # start the workers and load their networks before timing
+    explorer.search(time_budget=1)
+    explorer = MCTSExplorer([[0] * 11 for _ in range(11)], to_play=1)
+    start_time = time.monotonic()
+    num_simulation = explorer.search(time_budget=time_budget)
+    elapsed = time.monotonic() - start_time
+    print(f"Workers: {MCTSExplorer.WORKERS}, playouts: {num_simulation} in {elapsed:.2f}s, {num_simulation / elapsed:.0f} per second")
 
 
 if __name__ == '__main__':
+    # python mexplorer.py -bench [seconds]
+    if "-bench" in sys.argv:
+        benchmark(float(sys.argv[-1]) if sys.argv[-1] != "-bench" else MCTSExplorer.TIME_BUDGET)
+        sys.exit()
+
     board = [[0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
              [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
              [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
@@ -209,7 +414,7 @@ if __name__ == '__main__':
     explorer = MCTSExplorer(board, to_play=1)
 
     turn = 'mcts'
-    while not explorer.has_ended(explorer.root_state, explorer.root_node.player):
+    while not explorer.root_state.has_ended(explorer.root_node.player):
         if turn == 'mcts':
             num_simulation = explorer.search()
             print(f'Simulation: {num_simulation}')
@@ -219,5 +424,5 @@ if __name__ == '__main__':
         else:
             move = tuple(int(xx) for xx in input().split())
             explorer.make_move(move)
-        print_board(explorer.root_state)
+        print_board(explorer.root_state.board)
         # turn = 'mcts' if turn == 'user' else 'user'
@@ -21,48 +21,52 @@ class PolicyPredictor:
         Input: 11*11 board list
         Output: a list of top k (if have) positions (x, y), or a swap (-1, -1)
         """
-        # read in board
-        board = torch.tensor(board, dtype=torch.int8).to(device)
-        if not red_turn:
-            board = rotate_board(board)
-        board = board.unsqueeze(0)
+        return self.next_moves([board], [red_turn], allow_swap, k)[0]
+
+    def next_moves(self, boards, red_turns, allow_swap=False, k=10):
+        """
+        Decide the next moves for a batch of boards with one forward pass, so that encoding and calling the model are paid once for the whole batch.
+
+        Input: list of 11*11 board lists, whether it is red's turn on each of them
+        Output: for each board, a list of top k (if have) positions (x, y), or a swap (-1, -1)
+        """
+        # read in boards, seen from the player to move
+        tensors = []
+        for board, red_turn in zip(boards, red_turns):
+            board = torch.tensor(board, dtype=torch.int8)
+            if not red_turn:
+                board = rotate_board(board)
+            tensors.append(board)
         # make prediction
         with torch.no_grad():
-            pred = self.model(board)
-        # sort predictions
-        sorted_indices = pred.sort(descending=True).indices[0]
+            pred = self.model(torch.stack(tensors).to(device))
+        # sort predictions, then read them as plain lists rather than element by element
+        sorted_indices = pred.sort(descending=True).indices.tolist()
 
         # choose top k predictions
-        positions = []
-        num = 0
-        index = 0
-        while num < k and index < sorted_indices.shape[0]:
-            # get coordinates
-            idx = sorted_indices[index].item()
-            if idx == 121:
-                x = y = -1
-            else:
-                x, y = idx // 11, idx % 11
-
-            if x == -1:
-                # skip if not allow swap
-                if not allow_swap:
-                    index += 1
+        batch_positions = []
+        for board, red_turn, indices in zip(boards, red_turns, sorted_indices):
+            positions = []
+            for idx in indices:
+                if len(positions) == k:
+                    break
+                # get coordinates
+                if idx == 121:
+                    # skip if not allow swap
+                    if allow_swap:
+                        positions.append((-1, -1))
                     continue
-            else:
+                x, y = idx // 11, idx % 11
+                if not red_turn:
+                    x, y = y, x
                 # skip if the position is already occupied
-                if board[0, x, y] != 0:
-                    index += 1
+                if board[x][y] != 0:
                     continue
+                # record coordinates
+                positions.append((x, y))
+            batch_positions.append(positions)
 
-            # record coordinates
-            if not red_turn:
-                x, y = y, x
-            positions.append((x, y))
-            num += 1
-            index += 1
-
-        return positions
+        return batch_positions
 
 
 if __name__ == "__main__":
@@ -8,23 +8,45 @@ class Skynet:
     C_MIN = 0.15  # initial coefficient for MCTS to evaluation value
     C_MAX = 0.75
     TURN_TO_C_MAX = 40  # the turn when c reaches C_MAX
+    PONDER = True  # search during the opponent's turn
+
+    # loaded once per process and shared by every game, so that agents playing several games in a session only pay for it once
+    value_predictor = None
 
     def __init__(self):
         self.strategy = OpeningStrategy()
+        # start the search workers during the opening, rather than in the first search
+        if MCTSExplorer.WORKERS > 1:
+            MCTSExplorer.get_pool()
+
+    @classmethod
+    def load_value_predictor(cls):
+        if cls.value_predictor is None:
+            cls.value_predictor = ValuePredictor()
+        return cls.value_predictor
+
+    @classmethod
+    def preload(cls):
+        """
+        Load both networks up front, e.g. in a zygote before it forks an agent per game.
+        """
+        cls.load_value_predictor()
+        MCTSExplorer.load_policy_predictor()
 
     def next_move(self, board, red_turn=True):
+        self.stop_pondering()
         if self.strategy.is_apply():
             # apply opening strategy
             move = self.strategy.next_move(board, red_turn=red_turn)
             if not self.strategy.is_apply():
                 # initialise MCTS
                 self.explorer = MCTSExplorer(board, to_play=1 if red_turn else -1)
-                self.predictor = ValuePredictor()
+                self.predictor = self.load_value_predictor()
             return move
         else:
             # MCTS search
             self.explorer.search()
-            board = self.explorer.root_state
+            board = self.explorer.root_state.board
             children = self.explorer.root_node.children.values()
             moves = [child.move for child in children]
             # value evaluation
@@ -42,6 +64,18 @@ class Skynet:
         if not self.strategy.is_apply():
             self.explorer.make_move(move)
 
+    def ponder(self):
+        """
+        Start searching in the background until the next make_move or next_move, if the opening is over.
+        Call this after the own move has been sent, while waiting for the opponent.
+        """
+        if self.PONDER and not self.strategy.is_apply():
+            self.explorer.start_pondering()
+
+    def stop_pondering(self):
+        if not self.strategy.is_apply():
+            self.explorer.stop_pondering()
+
     def overall_score(self, node, eval_score, board):
         moves_num = count_moves(board)
         c = min(self.C_MIN + (self.C_MAX - self.C_MIN) * (moves_num / self.TURN_TO_C_MAX), self.C_MAX)
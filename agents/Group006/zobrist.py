@@ -0,0 +1,65 @@
+import random
+
+
+class ZobristHash:
+    """
+    64-bit Zobrist key of a list-of-lists board (1 for Red, -1 for Blue, 0 for empty), updated in O(1) per stone.
+    It gives the same keys as src/Zobrist.py in the engine, so the two can share opening books and caches.
+    The canonical key is shared by a position and its 180-degree rotation, which Hex is symmetric under.
+    """
+
+    SEED = 0x486578  # must match the engine
+
+    # random numbers by board size: one [red, blue] pair per tile x*n + y, and the swap number
+    tables = {}
+
+    def __init__(self, board_size=11):
+        self.board_size = board_size
+        self.tiles, self.swap_key = self.get_table(board_size)
+        self.key = 0
+        self.rotated_key = 0
+
+    @classmethod
+    def get_table(cls, n):
+        if n not in cls.tables:
+            rng = random.Random(cls.SEED + n)
+            tiles = [[rng.getrandbits(64), rng.getrandbits(64)] for _ in range(n * n)]
+            cls.tables[n] = (tiles, rng.getrandbits(64))
+        return cls.tables[n]
+
+    @classmethod
+    def from_board(cls, board):
+        """
+        Compute the key of a whole board from scratch.
+        """
+        z = cls(len(board))
+        for x, row in enumerate(board):
+            for y, value in enumerate(row):
+                z.toggle(x, y, value)
+        return z
+
+    def copy(self):
+        z = ZobristHash.__new__(ZobristHash)
+        z.__dict__.update(self.__dict__)
+        return z
+
+    def toggle(self, x, y, value):
+        """
+        Add a stone of the given value to the key, or remove it if it is there. 0 does nothing.
+        """
+        if value == 0:
+            return
+        idx = 0 if value == 1 else 1
+        n = self.board_size
+        self.key ^= self.tiles[x * n + y][idx]
+        self.rotated_key ^= self.tiles[(n - 1 - x) * n + n - 1 - y][idx]
+
+    def toggle_swap(self):
+        """
+        Record that the pie rule was used (or undo it); the stones stay where they are.
+        """
+        self.key ^= self.swap_key
+        self.rotated_key ^= self.swap_key
+
+    def canonical_key(self):
+        return min(self.key, self.rotated_key)
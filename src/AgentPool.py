@@ -0,0 +1,55 @@
+class AgentPool():
+    """Keeps agent processes alive between games, so that agents with a
+    slow start-up only pay for it once.
+
+    Agents opt in by accepting the SESSION capability (see
+    Protocol.acknowledge). When a game played with a pool ends normally,
+    such agents keep their connection open and are returned to the pool
+    instead of being closed. The next game with the same run string takes
+    the agent back, sends it "NEWGAME" and then the usual START message.
+    An agent whose connection is closed instead knows that no more games
+    follow. Agents that do not accept the capability are started and
+    closed once per game as usual.
+    """
+
+    def __init__(self):
+        super().__init__()
+
+        # idle agents by run string; each is a Protocol socket entry
+        self._idle = {}
+
+    def take(self, run_s):
+        """Returns an idle agent started with the given run string, or
+        None if there is none. Agents whose process has exited while idle
+        are discarded.
+        """
+
+        idle = self._idle.get(run_s, [])
+        while (len(idle) > 0):
+            x = idle.pop()
+            if (x['thread'].poll() is None):
+                return x
+            x['conn'].close()
+
+        return None
+
+    def put(self, run_s, x):
+        """Stores an agent that accepted the SESSION capability, together
+        with its open connection, for a later game.
+        """
+
+        self._idle.setdefault(run_s, []).append(x)
+
+    def close(self, kill_children=True):
+        """Ends every idle session. Closing its connection tells an agent
+        to exit; if kill_children=True, it is also forcibly terminated.
+        """
+
+        for idle in self._idle.values():
+            for x in idle:
+                x['conn'].close()
+                if (kill_children):
+                    x['thread'].kill()
+                x['thread'].wait()
+
+        self._idle = {}
@@ -0,0 +1,344 @@
+"""This script summarises recorded games of Hex.
+
+It reports each agent's win rate with a 95% confidence interval, move
+time percentiles, the first moves played with how often they were
+swapped, and the most common openings. Records are read from the CSV
+logs written with "-log" and from GameStore directories, one game at a
+time, so archives of any size can be read.
+
+With a state file, the totals are saved after each run, and the next
+run only reads the logs and store records added since.
+
+Possible arguments:
+* Any number of paths, as for Replay.py: GameStore directories,
+directories with CSV logs, or CSV logs.
+* "state=path" loads the totals from the given file before reading, and
+saves them there afterwards.
+* "top=n" sets the number of first moves and openings listed
+(default 10).
+"""
+import json
+import math
+from sys import argv
+from glob import glob
+from os.path import exists, isdir, join
+
+from EndState import EndState
+from GameStore import GameStore
+from Replay import read_csv
+
+
+def wilson_interval(wins, games, z=1.96):
+    """Returns the Wilson score interval (low, high) of a win rate. Unlike
+    the normal approximation, it stays within [0, 1] and behaves with
+    few games or extreme rates. z=1.96 gives a 95% interval.
+    """
+
+    if (games == 0):
+        return (0.0, 1.0)
+
+    rate = wins / games
+    denominator = 1 + z * z / games
+    centre = (rate + z * z / (2 * games)) / denominator
+    margin = z * math.sqrt(
+        rate * (1 - rate) / games + z * z / (4 * games * games)
+    ) / denominator
+    return (max(0.0, centre - margin), min(1.0, centre + margin))
+
+
+class TimeHistogram():
+    """Counts move times in buckets that grow geometrically, so that
+    percentiles can be estimated to within BUCKET_BASE without keeping
+    every time.
+    """
+
+    # each bucket is this much wider than the last; 2% precision
+    BUCKET_BASE = 1.02
+
+    def __init__(self, counts=None):
+        super().__init__()
+
+        self._counts = counts or {}  # bucket -> number of times
+        self._total = sum(self._counts.values())
+
+    def add(self, time):
+        """Counts a time in nanoseconds."""
+
+        bucket = 0
+        if (time > 1):
+            bucket = int(math.log(time, TimeHistogram.BUCKET_BASE))
+        self._counts[bucket] = self._counts.get(bucket, 0) + 1
+        self._total += 1
+
+    def percentile(self, p):
+        """Returns an estimate of the p-th percentile in nanoseconds, or 0
+        if nothing was counted.
+        """
+
+        if (self._total == 0):
+            return 0
+
+        rank = p / 100 * self._total
+        seen = 0
+        for bucket in sorted(self._counts):
+            seen += self._counts[bucket]
+            if (seen >= rank):
+                # the middle of the bucket
+                return int(TimeHistogram.BUCKET_BASE ** (bucket + 0.5))
+        return 0
+
+    def get_counts(self):
+        return self._counts
+
+
+class Analytics():
+    """Running totals over recorded games. Games are added one at a time
+    and the totals can be saved and loaded, so that later runs only need
+    to read new games.
+    """
+
+    # the number of moves that make up an opening
+    OPENING_LENGTH = 3
+
+    def __init__(self):
+        super().__init__()
+
+        self._agents = {}
+        self._first_moves = {}
+        self._openings = {}
+        self._end_states = {}
+
+        # what has been read: CSV logs by path, and the number of games
+        # read from each store shard, by "directory#shard"
+        self._seen_logs = set()
+        self._seen_shards = {}
+
+    def _get_agent(self, name):
+        if (name not in self._agents):
+            self._agents[name] = {
+                'games': 0,
+                'wins': 0,
+                'games as red': 0,
+                'wins as red': 0,
+                'timeouts': 0,
+                'illegal moves': 0,
+                'times': TimeHistogram()
+            }
+        return self._agents[name]
+
+    def add(self, record):
+        """Adds one GameRecord to the totals."""
+
+        state = EndState.get_text(record.end_state)
+        self._end_states[state] = self._end_states.get(state, 0) + 1
+
+        for name in (record.red, record.blue):
+            x = self._get_agent(name)
+            x['games'] += 1
+            if (name == record.red):
+                x['games as red'] += 1
+            if (name == record.winner):
+                x['wins'] += 1
+                if (name == record.red):
+                    x['wins as red'] += 1
+            elif (record.winner is not None):
+                # the loser is the one to blame for an early end
+                if (record.end_state == EndState.TIMEOUT):
+                    x['timeouts'] += 1
+                elif (record.end_state == EndState.BAD_MOVE):
+                    x['illegal moves'] += 1
+
+        # the agents move in turn, starting with Red
+        movers = (self._get_agent(record.red), self._get_agent(record.blue))
+        for idx, (x, y, time) in enumerate(record.moves):
+            if (time >= 0):
+                movers[idx % 2]['times'].add(time)
+
+        if (len(record.moves) > 0 and record.moves[0][0] >= 0):
+            x, y, _ = record.moves[0]
+            key = f"{record.board_size}:{x},{y}"
+            if (key not in self._first_moves):
+                self._first_moves[key] = {
+                    'games': 0, 'swapped': 0, 'first player wins': 0
+                }
+            entry = self._first_moves[key]
+            entry['games'] += 1
+            if (record.swapped):
+                entry['swapped'] += 1
+            if (record.winner is not None and record.winner == record.red):
+                entry['first player wins'] += 1
+
+        if (len(record.moves) >= Analytics.OPENING_LENGTH):
+            key = f"{record.board_size}:" + " ".join(
+                "SWAP" if x == -1 else f"{x},{y}"
+                for x, y, _ in record.moves[:Analytics.OPENING_LENGTH]
+            )
+            self._openings[key] = self._openings.get(key, 0) + 1
+
+    def ingest(self, paths):
+        """Adds every game in the given paths that has not been added yet.
+        Returns the number of games added.
+        """
+
+        added = 0
+        for path in paths:
+            if (isdir(path) and len(glob(join(path, "games*.bin"))) > 0):
+                store = GameStore(path)
+                for k in store.shards():
+                    key = f"{path}#{k}"
+                    start = self._seen_shards.get(key, 0)
+                    for record in store.shard_records(k, start):
+                        self.add(record)
+                        start += 1
+                        added += 1
+                    self._seen_shards[key] = start
+                continue
+
+            if (isdir(path)):
+                logs = sorted(glob(join(path, "**", "*.csv"), recursive=True))
+            else:
+                logs = [path]
+            for log in logs:
+                if (log in self._seen_logs):
+                    continue
+                try:
+                    record = read_csv(log)
+                except ValueError:
+                    # not a game log, or one still being written
+                    continue
+                self.add(record)
+                self._seen_logs.add(log)
+                added += 1
+
+        return added
+
+    def save(self, path):
+        """Saves the totals to a JSON file."""
+
+        agents = {}
+        for name, x in self._agents.items():
+            agents[name] = dict(x, times=x['times'].get_counts())
+
+        with open(path, "w") as f:
+            json.dump({
+                'agents': agents,
+                'first moves': self._first_moves,
+                'openings': self._openings,
+                'end states': self._end_states,
+                'seen logs': sorted(self._seen_logs),
+                'seen shards': self._seen_shards
+            }, f)
+
+    @staticmethod
+    def load(path):
+        """Returns the totals saved in a JSON file by save."""
+
+        with open(path) as f:
+            data = json.load(f)
+
+        a = Analytics()
+        for name, x in data['agents'].items():
+            counts = {int(k): v for k, v in x['times'].items()}
+            a._agents[name] = dict(x, times=TimeHistogram(counts))
+        a._first_moves = data['first moves']
+        a._openings = data['openings']
+        a._end_states = data['end states']
+        a._seen_logs = set(data['seen logs'])
+        a._seen_shards = data['seen shards']
+        return a
+
+    def print_report(self, top=10):
+        """Prints the totals as tables."""
+
+        games = sum(self._end_states.values())
+        print(f"{games} games: " + ", ".join(
+            f"{count} {state}" for state, count in
+            sorted(self._end_states.items())
+        ))
+
+        width = max([len("Agent")] + [len(name) for name in self._agents])
+        print()
+        print(
+            f"{'Agent':<{width}} {'Games':>6} {'Win%':>6} " +
+            f"{'95% CI':>13} {'Red W/G':>11} {'T/O':>4} {'Bad':>4} " +
+            f"{'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9}"
+        )
+        ranking = sorted(
+            self._agents.items(),
+            key=lambda item: item[1]['wins'] / max(item[1]['games'], 1),
+            reverse=True
+        )
+        for name, x in ranking:
+            low, high = wilson_interval(x['wins'], x['games'])
+            win_rate = 100 * x['wins'] / max(x['games'], 1)
+            # milliseconds; fast agents move in well under Game.ns_to_s's
+            # resolution of 1ms
+            percentiles = [
+                x['times'].percentile(p) / 10**6 for p in (50, 95, 99)
+            ]
+            print(
+                f"{name:<{width}} {x['games']:>6} {win_rate:>6.1f} " +
+                f"{100 * low:>6.1f}-{100 * high:<6.1f} " +
+                f"{x['wins as red']:>5}/{x['games as red']:<5} " +
+                f"{x['timeouts']:>4} {x['illegal moves']:>4} " +
+                f"{percentiles[0]:>9.3f} {percentiles[1]:>9.3f} " +
+                f"{percentiles[2]:>9.3f}"
+            )
+
+        print()
+        print(
+            f"{'First move':<12} {'Games':>6} {'Swap%':>6} " +
+            f"{'First player win%':>18}"
+        )
+        ranking = sorted(
+            self._first_moves.items(),
+            key=lambda item: item[1]['games'],
+            reverse=True
+        )
+        for key, entry in ranking[:top]:
+            print(
+                f"{key:<12} {entry['games']:>6} " +
+                f"{100 * entry['swapped'] / entry['games']:>6.1f} " +
+                f"{100 * entry['first player wins'] / entry['games']:>18.1f}"
+            )
+
+        print()
+        print(f"{'Opening':<30} {'Games':>6}")
+        ranking = sorted(
+            self._openings.items(), key=lambda item: item[1], reverse=True
+        )
+        for key, count in ranking[:top]:
+            print(f"{key:<30} {count:>6}")
+
+
+def main():
+    paths = []
+    state_path = None
+    top = 10
+
+    try:
+        for argument in argv[1:]:
+            if (argument.startswith("state=")):
+                state_path = argument.split("=", 1)[1]
+            elif (argument.startswith("top=")):
+                top = int(argument.split("=")[1])
+            else:
+                paths.append(argument)
+    except Exception:
+        print(f"ERROR: Argument '{argument}' is not in valid format. Aborted.")
+        return
+
+    a = Analytics()
+    if (state_path is not None and exists(state_path)):
+        a = Analytics.load(state_path)
+
+    added = a.ingest(paths)
+    print(f"Read {added} new games.")
+    if (state_path is not None):
+        a.save(state_path)
+
+    a.print_report(top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+from Tile import Tile
+from Colour import Colour
+from BoardString import BoardString
+from Zobrist import Zobrist
+
+
+class BitBoard:
+    """A compact Hex board backend with the same interface as Board.
+
+    Red and Blue occupancy are stored as two integer bitmasks, where tile
+    (x, y) is bit x*n + y. Neighbour, flood-fill and occupancy queries are
+    bitwise operations, and copying a board only copies a few integers.
+    """
+
+    def __init__(self, board_size=11):
+        super().__init__()
+
+        self._board_size = board_size
+        self._red = 0
+        self._blue = 0
+        self._winner = None
+        self._string = BoardString(board_size)
+        self._zobrist = Zobrist(board_size)
+
+        # (x, y, winner) of every stone placed by push
+        self._stack = []
+
+        self._init_masks()
+
+    def _init_masks(self):
+        """Precomputes the masks used for shifting and edge detection."""
+
+        n = self._board_size
+        self._full = (1 << (n * n)) - 1
+
+        first_column = 0
+        for i in range(n):
+            first_column |= 1 << (i * n)
+        self._not_first_column = self._full & ~first_column
+        self._not_last_column = self._full & ~(first_column << (n - 1))
+
+        self._top_row = (1 << n) - 1
+        self._bottom_row = self._top_row << (n * (n - 1))
+        self._left_column = first_column
+        self._right_column = first_column << (n - 1)
+
+    def from_string(string_input, board_size=11, bnf=True):
+        """Loads a board from a string representation. If bnf=True, it will
+        load a protocol-formatted string. Otherwise, it will load from a
+        human-readable-formatted board.
+        """
+
+        b = BitBoard(board_size=board_size)
+
+        if (bnf):
+            lines = string_input.split(",")
+            for i, line in enumerate(lines):
+                for j, char in enumerate(line):
+                    b.set_tile_colour(i, j, Colour.from_char(char))
+        else:
+            lines = [line.strip() for line in string_input.split("\n")]
+            for i, line in enumerate(lines):
+                chars = line.split(" ")
+                for j, char in enumerate(chars):
+                    b.set_tile_colour(i, j, Colour.from_char(char))
+
+        return b
+
+    def copy(self):
+        """Returns an independent copy of the board."""
+
+        b = BitBoard.__new__(BitBoard)
+        b.__dict__.update(self.__dict__)
+        b._string = self._string.copy()
+        b._zobrist = self._zobrist.copy()
+        b._stack = list(self._stack)
+        return b
+
+    def neighbours(self, mask):
+        """Returns the mask of all tiles adjacent to any tile in mask,
+        using the same neighbourhood as Tile.
+        """
+
+        n = self._board_size
+        return (
+            (mask >> n) |
+            ((mask >> (n - 1)) & self._not_first_column) |
+            ((mask << 1) & self._not_first_column) |
+            (mask << n) |
+            ((mask << (n - 1)) & self._not_last_column) |
+            ((mask >> 1) & self._not_last_column)
+        ) & self._full
+
+    def flood_fill(self, seed, stones):
+        """Returns the mask of tiles in stones that are connected to seed
+        through stones.
+        """
+
+        reached = seed & stones
+        while (True):
+            grown = (reached | self.neighbours(reached)) & stones
+            if (grown == reached):
+                return reached
+            reached = grown
+
+    def has_ended(self):
+        """Checks if the game has ended. It will attempt to find a red chain
+        from top to bottom or a blue chain from left to right of the board.
+        """
+
+        if (self._winner is None):
+            if (self.flood_fill(self._top_row, self._red) &
+                    self._bottom_row):
+                self._winner = Colour.RED
+            elif (self.flood_fill(self._left_column, self._blue) &
+                    self._right_column):
+                self._winner = Colour.BLUE
+
+        return self._winner is not None
+
+    def print_board(self, bnf=True):
+        """Returns the string representation of a board. If bnf=True, the
+        string will be formatted according to the communication protocol.
+        """
+
+        if (bnf):
+            return self._string.bnf()
+        else:
+            return self._string.human()
+
+    def get_winner(self):
+        return self._winner
+
+    def get_size(self):
+        return self._board_size
+
+    def get_key(self):
+        """Returns the 64-bit Zobrist key of the position; see Zobrist."""
+        return self._zobrist.get_key()
+
+    def get_canonical_key(self):
+        """Returns the Zobrist key shared with the 180-degree rotation of
+        the position.
+        """
+        return self._zobrist.get_canonical_key()
+
+    def swap(self):
+        """Records in the key that the pie rule was used. The stones stay
+        where they are; the agents change colours instead.
+        """
+        self._zobrist.toggle_swap()
+
+    def get_tiles(self):
+        """Returns a snapshot of the board as a grid of Tile objects. Changes
+        to these tiles are not reflected on the board.
+        """
+
+        n = self._board_size
+        return [
+            [Tile(i, j, self.get_tile_colour(i, j)) for j in range(n)]
+            for i in range(n)
+        ]
+
+    def push(self, x, y, colour):
+        """Places a stone on an empty tile so that pop can take it back,
+        as in Board. Raises ValueError if the tile is occupied.
+        """
+
+        if (self.get_tile_colour(x, y) is not None):
+            raise ValueError(f"Tile {x},{y} is occupied.")
+
+        self._stack.append((x, y, self._winner))
+        self.set_tile_colour(x, y, colour)
+
+    def pop(self):
+        """Takes back the last stone placed by push. Raises IndexError if
+        there is none.
+        """
+
+        x, y, winner = self._stack.pop()
+        self.set_tile_colour(x, y, None)
+        self._winner = winner
+
+    def get_depth(self):
+        """Returns the number of stones that pop can take back."""
+        return len(self._stack)
+
+    def get_occupied(self):
+        """Returns the mask of all occupied tiles."""
+
+        return self._red | self._blue
+
+    def get_stones(self, colour):
+        """Returns the mask of tiles occupied by the given colour."""
+
+        if (colour == Colour.RED):
+            return self._red
+        elif (colour == Colour.BLUE):
+            return self._blue
+        else:
+            return self._full & ~(self._red | self._blue)
+
+    def get_tile_colour(self, x, y):
+        bit = 1 << (x * self._board_size + y)
+        if (self._red & bit):
+            return Colour.RED
+        elif (self._blue & bit):
+            return Colour.BLUE
+        else:
+            return None
+
+    def set_tile_colour(self, x, y, colour):
+        self._zobrist.toggle(x, y, self.get_tile_colour(x, y))
+        self._zobrist.toggle(x, y, colour)
+
+        bit = 1 << (x * self._board_size + y)
+        self._red &= ~bit
+        self._blue &= ~bit
+
+        if (colour == Colour.RED):
+            self._red |= bit
+        elif (colour == Colour.BLUE):
+            self._blue |= bit
+        self._string.set_colour(x, y, colour)
+
+        # a recoloured tile may break a winning chain
+        if (self._winner is not None and colour != self._winner):
+            self._winner = None
+
+
+if (__name__ == "__main__"):
+    b = BitBoard.from_string(
+        "0R000B00000,0R000000000,0RBB0000000,0R000000000,0R00B000000," +
+        "0R000BB0000,0R0000B0000,0R00000B000,0R000000B00,0R0000000B0," +
+        "0R00000000B", bnf=True
+    )
+    print(b.print_board(bnf=False))
+    print(b.has_ended(), b.get_winner())
@@ -1,5 +1,8 @@
 from Tile import Tile
 from Colour import Colour
+from BoardString import BoardString
+from UnionFind import RollbackUnionFind
+from Zobrist import Zobrist
 
 
 class Board:
@@ -18,6 +21,18 @@ class Board:
             self._tiles.append(new_line)
 
         self._winner = None
+        self._string = BoardString(board_size)
+        self._zobrist = Zobrist(board_size)
+
+        # connectivity of placed stones, with one virtual node per side
+        self._top = board_size * board_size
+        self._bottom = self._top + 1
+        self._left = self._top + 2
+        self._right = self._top + 3
+        self._groups = RollbackUnionFind(board_size * board_size + 4)
+
+        # (x, y, union checkpoint, winner) of every stone placed by push
+        self._stack = []
 
     def from_string(string_input, board_size=11, bnf=True):
         """Loads a board from a string representation. If bnf=True, it will
@@ -42,93 +57,62 @@ class Board:
         return b
 
     def has_ended(self):
-        """Checks if the game has ended. It will attempt to find a red chain
-        from top to bottom or a blue chain from left to right of the board.
+        """Checks if the game has ended. A red chain from top to bottom or a
+        blue chain from left to right of the board joins the two virtual
+        side nodes in the same group, so this is a constant-time lookup.
         """
 
-        # Red
-        # for all top tiles, check if they connect to bottom
-        for idx in range(self._board_size):
-            tile = self._tiles[0][idx]
-            if (not tile.is_visited() and
-                tile.get_colour() == Colour.RED and
-                    self._winner is None):
-                self.DFS_colour(0, idx, Colour.RED)
-        # Blue
-        # for all left tiles, check if they connect to right
-        for idx in range(self._board_size):
-            tile = self._tiles[idx][0]
-            if (not tile.is_visited() and
-                tile.get_colour() == Colour.BLUE and
-                    self._winner is None):
-                self.DFS_colour(idx, 0, Colour.BLUE)
-
-        # un-visit tiles
-        self.clear_tiles()
+        if (self._winner is None):
+            if (self._groups.connected(self._top, self._bottom)):
+                self._winner = Colour.RED
+            elif (self._groups.connected(self._left, self._right)):
+                self._winner = Colour.BLUE
 
         return self._winner is not None
 
-    def clear_tiles(self):
-        """Clears the visited status from all tiles."""
-
-        for line in self._tiles:
-            for tile in line:
-                tile.clear_visit()
+    def push(self, x, y, colour):
+        """Places a stone on an empty tile so that pop can take it back.
+        Raises ValueError if the tile is occupied.
 
-    def DFS_colour(self, x, y, colour):
-        """A recursive DFS method that iterates through connected same-colour
-        tiles until it finds a bottom tile (Red) or a right tile (Blue).
+        Search code can play a line of moves and then return to the
+        starting position with as many pops, instead of copying the
+        board.
         """
 
-        self._tiles[x][y].visit()
+        if (self._tiles[x][y].get_colour() is not None):
+            raise ValueError(f"Tile {x},{y} is occupied.")
 
-        # win conditions
-        if (colour == Colour.RED):
-            if (x == self._board_size-1):
-                self._winner = colour
-        elif (colour == Colour.BLUE):
-            if (y == self._board_size-1):
-                self._winner = colour
-        else:
-            return
+        self._stack.append(
+            (x, y, self._groups.get_checkpoint(), self._winner)
+        )
+        self.set_tile_colour(x, y, colour)
 
-        # end condition
-        if (self._winner is not None):
-            return
+    def pop(self):
+        """Takes back the last stone placed by push, with the connectivity
+        it added. Raises IndexError if there is none.
+        """
 
-        # visit neighbours
-        for idx in range(Tile.NEIGHBOUR_COUNT):
-            x_n = x + Tile.I_DISPLACEMENTS[idx]
-            y_n = y + Tile.J_DISPLACEMENTS[idx]
-            if (x_n >= 0 and x_n < self._board_size and
-                    y_n >= 0 and y_n < self._board_size):
-                neighbour = self._tiles[x_n][y_n]
-                if (not neighbour.is_visited() and
-                        neighbour.get_colour() == colour):
-                    self.DFS_colour(x_n, y_n, colour)
+        x, y, checkpoint, winner = self._stack.pop()
+        tile = self._tiles[x][y]
+        self._zobrist.toggle(x, y, tile.get_colour())
+        tile.set_colour(None)
+        self._string.set_colour(x, y, None)
+        self._groups.rollback(checkpoint)
+        self._winner = winner
+
+    def get_depth(self):
+        """Returns the number of stones that pop can take back."""
+        return len(self._stack)
 
     def print_board(self, bnf=True):
         """Returns the string representation of a board. If bnf=True, the
         string will be formatted according to the communication protocol.
         """
 
-        output = ""
         if (bnf):
-            for line in self._tiles:
-                for tile in line:
-                    output += Colour.get_char(tile.get_colour())
-                output += ","
-            output = output[:-1]
+            return self._string.bnf()
         else:
-            leading_spaces = ""
-            for line in self._tiles:
-                output += leading_spaces
-                leading_spaces += " "
-                for tile in line:
-                    output += Colour.get_char(tile.get_colour()) + " "
-                output += "\n"
-
-        return output
+            return self._string.human()
 
     def get_winner(self):
         return self._winner
@@ -136,11 +120,87 @@ class Board:
     def get_size(self):
         return self._board_size
 
+    def get_key(self):
+        """Returns the 64-bit Zobrist key of the position; see Zobrist."""
+        return self._zobrist.get_key()
+
+    def get_canonical_key(self):
+        """Returns the Zobrist key shared with the 180-degree rotation of
+        the position.
+        """
+        return self._zobrist.get_canonical_key()
+
+    def swap(self):
+        """Records in the key that the pie rule was used. The stones stay
+        where they are; the agents change colours instead.
+        """
+        self._zobrist.toggle_swap()
+
     def get_tiles(self):
         return self._tiles
 
+    def get_tile_colour(self, x, y):
+        return self._tiles[x][y].get_colour()
+
     def set_tile_colour(self, x, y, colour):
-        self._tiles[x][y].set_colour(colour)
+        tile = self._tiles[x][y]
+        previous = tile.get_colour()
+        tile.set_colour(colour)
+        self._string.set_colour(x, y, colour)
+        self._zobrist.toggle(x, y, previous)
+        self._zobrist.toggle(x, y, colour)
+
+        if (previous is None):
+            self._connect(x, y, colour)
+        elif (previous != colour):
+            # groups cannot be split, so start over
+            self._rebuild_groups()
+
+    def _connect(self, x, y, colour):
+        """Merges a newly coloured tile with its same-colour neighbours and,
+        if it lies on one of its colour's sides, with that side's virtual
+        node.
+        """
+
+        if (colour is None):
+            return
+
+        size = self._board_size
+        node = x * size + y
+
+        if (colour == Colour.RED):
+            if (x == 0):
+                self._groups.union(node, self._top)
+            if (x == size - 1):
+                self._groups.union(node, self._bottom)
+        else:
+            if (y == 0):
+                self._groups.union(node, self._left)
+            if (y == size - 1):
+                self._groups.union(node, self._right)
+
+        for idx in range(Tile.NEIGHBOUR_COUNT):
+            x_n = x + Tile.I_DISPLACEMENTS[idx]
+            y_n = y + Tile.J_DISPLACEMENTS[idx]
+            if (x_n >= 0 and x_n < size and
+                    y_n >= 0 and y_n < size and
+                    self._tiles[x_n][y_n].get_colour() == colour):
+                self._groups.union(node, x_n * size + y_n)
+
+    def _rebuild_groups(self):
+        """Recomputes all groups from scratch. Only needed when an already
+        occupied tile changes colour.
+        """
+
+        self._winner = None
+        self._groups = RollbackUnionFind(
+            self._board_size * self._board_size + 4
+        )
+        # the pushed stones' checkpoints are gone with the old groups
+        self._stack = []
+        for line in self._tiles:
+            for tile in line:
+                self._connect(tile.get_x(), tile.get_y(), tile.get_colour())
 
 
 if (__name__ == "__main__"):
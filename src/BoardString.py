@@ -0,0 +1,66 @@
+from Colour import Colour
+
+
+class BoardString:
+    """The protocol-formatted text of a board, kept up to date one tile at a
+    time instead of being rebuilt from every tile on each request.
+
+    The text is stored in a bytearray laid out exactly like the BOARD
+    argument of the protocol, so setting a tile only changes one byte.
+    """
+
+    CHARS = {
+        Colour.RED: ord("R"),
+        Colour.BLUE: ord("B"),
+        None: ord("0")
+    }
+
+    def __init__(self, board_size=11):
+        super().__init__()
+
+        self._board_size = board_size
+
+        # each row is followed by a comma, except for the last one
+        self._offsets = [i * (board_size + 1) for i in range(board_size)]
+        line = b"0" * board_size
+        self._buffer = bytearray(b",".join([line] * board_size))
+
+        self._bnf = None  # cached decoded text
+
+    def copy(self):
+        """Returns an independent copy of the text."""
+
+        s = BoardString.__new__(BoardString)
+        s._board_size = self._board_size
+        s._offsets = self._offsets
+        s._buffer = bytearray(self._buffer)
+        s._bnf = self._bnf
+        return s
+
+    def set_colour(self, x, y, colour):
+        """Updates the character of a single tile."""
+
+        self._buffer[self._offsets[x] + y] = BoardString.CHARS[colour]
+        self._bnf = None
+
+    def get_char(self, x, y):
+        return chr(self._buffer[self._offsets[x] + y])
+
+    def bnf(self):
+        """Returns the board formatted according to the protocol."""
+
+        if (self._bnf is None):
+            self._bnf = self._buffer.decode("ascii")
+        return self._bnf
+
+    def human(self):
+        """Returns the board in the human-readable format, with each row
+        shifted one space further to the right.
+        """
+
+        n = self._board_size
+        output = []
+        for i, offset in enumerate(self._offsets):
+            line = self._buffer[offset:offset + n].decode("ascii")
+            output.append(" " * i + " ".join(line) + " \n")
+        return "".join(output)
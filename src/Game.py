@@ -1,25 +1,42 @@
 from sys import stderr
-from time import time_ns as time
+# a monotonic clock, so that move times are not thrown off by changes
+# to the system clock
+from time import perf_counter_ns as time
 from os.path import realpath, sep
-from os.path import exists
 from datetime import datetime
 from pathlib import Path
 
 from Colour import Colour
 from Board import Board
+from BitBoard import BitBoard
 from Move import Move
 from Protocol import Protocol
+from InProcessAgent import InProcessAgent
 from EndState import EndState
+from GameStore import GameRecord
+from TimeControl import TimeControl
 
 
 class Game():
     """This class describes a game of Hex."""
 
-    # the maximum time allocated for a match per player
+    # the default time allocated for a match per player; pass a
+    # TimeControl to Game for other budgets, increments or move caps
     # 5 minutes in nanoseconds (min * s/min * ns/s)
-    MAXIMUM_TIME = 5 * 60 * 10**9
-    # 1 second in nanoseconds
-    # MAXIMUM_TIME = 10**9
+    MAXIMUM_TIME = TimeControl.TOTAL
+    # how long agents have to connect, whatever the time control
+    CONNECTION_TIME = 5 * 60 * 10**9
+
+    # in compact mode, every this many turns the full board is sent anyway
+    # so that agents can check their own copy
+    DELTA_RESYNC_INTERVAL = 16
+
+    # log rows are kept in memory and appended to the file in batches of
+    # this many, so that a killed engine still leaves a partial log
+    LOG_BUFFER_LINES = 64
+
+    # the first CSV log file name to try; see _start_log
+    _log_index = 0
 
     def __init__(
         self,
@@ -36,26 +53,46 @@ class Game():
         log=True,
         print_protocol=False,
         kill_bots=True,
-        silent_bots=True
+        silent_bots=True,
+        bitboard=False,
+        delta=False,
+        port=Protocol.PORT,
+        report=True,
+        pool=None,
+        store=None,
+        time_control=None
     ):
         self._turn = 1  # current turn count
-        self._board = Board(board_size)
+        if (bitboard):
+            self._board = BitBoard(board_size)
+        else:
+            self._board = Board(board_size)
         self._player = Colour.RED  # current player
         self._start_time = 0  # used to calculate time elapsed
         self._has_swapped = False  # pie rule
+        self._results = None  # filled in by _end_game
+        self._moves = []  # (x, y, time) of every move, for the store
+        self._time_control = time_control or TimeControl()
+        self._store = store
 
         self._players = {
             Colour.RED: {
                 'name': None,
                 'run string': None,
                 'turns': 0,
-                'time': 0
+                'time': 0,
+                'cpu start': None,  # CPU time used before the game
+                'cpu time': None,  # CPU time used in the game, last read
+                'peak memory': None  # highest peak memory read
             },
             Colour.BLUE: {
                 'name': None,
                 'run string': None,
                 'turns': 0,
-                'time': 0
+                'time': 0,
+                'cpu start': None,
+                'cpu time': None,
+                'peak memory': None
             }
         }
         self._players[Colour.RED]['name'] = player1['name']
@@ -63,12 +100,21 @@ class Game():
         self._players[Colour.BLUE]['name'] = player2['name']
         self._players[Colour.BLUE]['run string'] = player2['run string']
 
+        # optional protocol capabilities offered to the agents
+        self._capabilities = []
+        if (delta):
+            self._capabilities.append("DELTA")
+        if (pool is not None):
+            self._capabilities.append("SESSION")
+
+        self._protocol = Protocol(port, pool)
         self._kill_bots = kill_bots
         self._silent_bots = silent_bots
 
         self._verbose = verbose
         self._print_protocol = print_protocol
         self._log = log
+        self._report = report  # print the short-form results when done
         self._start_log()
 
     def run(self):
@@ -110,10 +156,15 @@ class Game():
                              f"{self._board.get_size()}x" +
                              f"{self._board.get_size()}."),
             protocol_message=f"START;{self._board.get_size()};",
-            start=True
+            start=True,
+            event=("start", self._board.get_size())
         )
 
         self._start_time = time()
+        for colour in Colour:
+            self._players[colour]['cpu start'] = (
+                self._protocol.get_cpu_time(colour)
+            )
         end_state = EndState.WIN
 
         while (not self._board.has_ended()):
@@ -128,10 +179,18 @@ class Game():
                 verbose_message=self._board.print_board(bnf=False)
             )
 
+            # the other agent disconnected while this one was thinking;
+            # it loses as if it had timed out on its next turn
+            if (m is None):
+                end_state = EndState.TIMEOUT
+                self._player = self._player.opposite()
+                self._players[self._player]['time'] += self._get_time_left()
+                break
+
             # timeout
             if (move_time == -1):
                 end_state = EndState.TIMEOUT
-                self._players[self._player]['time'] = Game.MAXIMUM_TIME
+                self._players[self._player]['time'] += self._get_time_left()
                 break
 
             # illegal move
@@ -171,9 +230,23 @@ class Game():
         verbose_message = (
             f"{self._players[self._player]['name']} {verbose_message}"
         )
-        protocol_message += f"{self._board.print_board()};{next_player}\n"
 
-        self._send_message(verbose_message, protocol_message)
+        # agents that accepted DELTA only get the full board on resyncs
+        compact_message = ""
+        if (self._turn % Game.DELTA_RESYNC_INTERVAL != 0):
+            compact_message = protocol_message + f";{next_player}\n"
+        # in-process agents need no text at all
+        if (self._protocol.get_agent(Colour.RED) is None or
+                self._protocol.get_agent(Colour.BLUE) is None):
+            protocol_message += (
+                f"{self._board.print_board()};{next_player}\n"
+            )
+
+        self._send_message(
+            verbose_message, protocol_message,
+            compact_message=compact_message,
+            event=("on_change", (m.get_x(), m.get_y()), next_player)
+        )
 
     def get_next_player(self):
         """Returns END if the game is over or the opposite player
@@ -189,55 +262,98 @@ class Game():
         self,
         verbose_message="",
         protocol_message="",
-        start=False
+        start=False,
+        compact_message="",
+        event=None
     ):
         """Sends messages to the shell or the agents through
         standardised channels. This does not include CSV logging.
+
+        If compact_message is given, it is sent instead of
+        protocol_message to the agents that accepted the DELTA
+        capability. In-process agents get event instead: the name of
+        one of their hooks followed by its arguments. For start events,
+        the agent's colour is appended to the arguments.
         """
 
         if (self._verbose and verbose_message != ""):
             print(verbose_message)
 
-        if (protocol_message != ""):
+        if (protocol_message == "" and event is None):
+            return
+
+        offer = ""
+        if (len(self._capabilities) > 0):
+            offer = ";" + ",".join(self._capabilities)
+
+        for colour in Colour:
+            verbose = self._print_protocol and colour == Colour.RED
+
+            if (self._protocol.get_agent(colour) is not None):
+                if (event is not None):
+                    args = event[1:]
+                    if (start):
+                        args += (colour.get_char(),)
+                    self._protocol.notify_agent(
+                        colour, event[0], *args, verbose=verbose
+                    )
+                continue
+
+            if (protocol_message == ""):
+                continue
+
+            message = protocol_message
             if (start):
-                Protocol.send_message(
-                    Colour.RED, f"{protocol_message}R\n",
-                    verbose=self._print_protocol
-                )
-                Protocol.send_message(
-                    Colour.BLUE, f"{protocol_message}B\n"
-                )
-            else:
-                Protocol.send_message(
-                    Colour.RED, protocol_message,
-                    verbose=self._print_protocol
-                )
-                Protocol.send_message(
-                    Colour.BLUE, protocol_message
-                )
+                message = f"{protocol_message}{colour.get_char()}{offer}\n"
+            elif (compact_message != "" and
+                    self._protocol.has_capability(colour, "DELTA")):
+                message = compact_message
+            self._protocol.send_message(colour, message, verbose=verbose)
 
     def _get_move(self):
         """Receives a move from the currently playing agent.
 
-        Returns a tuple (move, time). move is a Move object, and
+        Returns a tuple (move, time). move is a Move object, or None
+        if the other agent disconnected before this one answered, and
         time is either an integer representing the time taken in
-        nanoseconds, or False if the agent times out. Snapshot
+        nanoseconds, or -1 if the agent times out. Snapshot
         error is less than 1/100s, but it reflects in the logs.
         The default agent is sometimes too fast to be recorded.
         """
 
-        time_left = Game.MAXIMUM_TIME - self._players[self._player]['time']
-        time_left = max(time_left, 0)
-
-        answer, move_time = Protocol.get_message(
-            self._player,
-            time_left,
-            self._print_protocol
+        time_left = self._get_time_left()
+        # moves are timed by the wall clock where CPU time is not available
+        cpu_clock = (
+            self._time_control.cpu_clock and
+            self._players[self._player]['cpu start'] is not None
         )
 
+        if (self._protocol.get_agent(self._player) is not None):
+            answer, move_time = self._protocol.get_move(
+                self._player,
+                time_left,
+                self._print_protocol,
+                cpu_clock
+            )
+            self._sample_usage()
+            if (answer == (-1, -1)):
+                answer = ["SWAP"]
+        else:
+            answer, move_time = self._protocol.get_message(
+                self._player,
+                time_left,
+                self._print_protocol,
+                cpu_clock
+            )
+            self._sample_usage()
+            if (move_time == -1 and self._protocol.has_disconnected(
+                    self._player.opposite())):
+                # nothing to log; the game ends without this move
+                return (None, -1)
+            answer = answer.strip().split(",")
+
         move, log_message = None, 0
         try:
-            answer = answer.strip().split(",")
             if (len(answer) == 2):
                 # normal move
                 x, y = int(answer[0]), int(answer[1])
@@ -264,15 +380,44 @@ class Game():
             log_message = (
                 f"{self._turn}," +
                 f"{self._players[self._player]['name']}," +
-                f"-2,{''.join(answer)},{move_time}"
+                f"-2,{''.join(str(x) for x in answer)},{move_time}"
             )
             move = Move(self._player, -2, -2)
 
         self._write_log(log_message)
+        self._moves.append((move.x, move.y, move_time))
         return (move, move_time)
 
+    def _sample_usage(self):
+        """Reads the resources used so far by both agents, since either may
+        be working during the other's turn. Readings that fail keep the
+        previous ones, so an agent that exits when the game ends still
+        reports its usage up to its last move.
+        """
+
+        for colour in Colour:
+            player = self._players[colour]
+            cpu_time = self._protocol.get_cpu_time(colour)
+            if (cpu_time is not None and player['cpu start'] is not None):
+                player['cpu time'] = cpu_time - player['cpu start']
+            peak_memory = self._protocol.get_peak_memory(colour)
+            if (peak_memory is not None):
+                player['peak memory'] = max(
+                    peak_memory, player['peak memory'] or 0
+                )
+
+    def _get_time_left(self):
+        """Returns how long the current player may take over its move."""
+
+        return self._time_control.get_time_left(
+            self._players[self._player]['time'],
+            self._players[self._player]['turns']
+        )
+
     def _swap(self):
-        """Swaps the players' colours in Game and in Protocol."""
+        """Swaps the players' colours in Game and in Protocol, and records
+        the swap in the board's position key.
+        """
 
         self._players[Colour.RED], self._players[Colour.BLUE] = (
             self._players[Colour.BLUE], self._players[Colour.RED]
@@ -281,7 +426,8 @@ class Game():
         self._has_swapped = True
         self._player = Colour.opposite(self._player)
 
-        Protocol.swap()
+        self._board.swap()
+        self._protocol.swap()
 
     def _flip_turn(self, move_time):
         """Increments the statistics of the current player, then
@@ -404,10 +550,42 @@ class Game():
                 f"{self._players[colour]['time']},{means[colour]}\n"
             )
 
-        self._send_message(verbose_message, protocol_message)
+        # resources used by the agents, on either side's turn; read once
+        # more, though agents that exit on the last move keep their
+        # readings from after each move
+        self._sample_usage()
+        for colour in Colour:
+            cpu_time = self._players[colour]['cpu time']
+            peak_memory = self._players[colour]['peak memory']
+
+            if (cpu_time is not None):
+                verbose_message += (
+                    f"{self._players[colour]['name']} used " +
+                    f"{Game.ns_to_s(cpu_time)}s of CPU time"
+                )
+                if (peak_memory is not None):
+                    verbose_message += (
+                        ", with a peak memory of " +
+                        f"{round(peak_memory / 2**20, 1)}MiB"
+                    )
+                verbose_message += ".\n"
+            # marked by the last field, which no other row can end with
+            log_message += (
+                f"0,{self._players[colour]['name']}," +
+                f"{-1 if cpu_time is None else cpu_time}," +
+                f"{-1 if peak_memory is None else peak_memory},Usage\n"
+            )
+
+        winner = None
+        if (status is not None):
+            winner = self._player.get_char()
+        self._send_message(
+            verbose_message, protocol_message, event=("end", winner)
+        )
         self._write_log(log_message)
+        self._flush_log()
 
-        if (self._log):
+        if (self._log and self._report):
             print(f"Saved log to {self._log_path}")
 
         # short-form results; easier to read than verbose option
@@ -422,36 +600,117 @@ class Game():
         final_message = (
             f"{EndState.get_text(status)}\n{red_end_s}\n{blue_end_s}"
         )
-        print(final_message, file=stderr)
+        if (self._report):
+            print(final_message, file=stderr)
+
+        # the same results in structured form, for callers running many
+        # games; agents are identified by name since colours may swap
+        first = Colour.BLUE if self._has_swapped else Colour.RED
+        self._results = {
+            'end state': status,
+            'winner': None,
+            'red': self._players[first]['name'],
+            'swapped': self._has_swapped,
+            'turns': self._turn,
+            'time': total_time,
+            'players': {},
+            'game id': None
+        }
+        if (status is not None):
+            self._results['winner'] = self._players[self._player]['name']
+        for colour in Colour:
+            self._results['players'][self._players[colour]['name']] = {
+                'turns': self._players[colour]['turns'],
+                'time': self._players[colour]['time'],
+                # None where they cannot be measured
+                'cpu time': self._players[colour]['cpu time'],
+                'peak memory': self._players[colour]['peak memory']
+            }
 
-        # close communications
-        Protocol.close(
+        if (self._store is not None):
+            self._results['game id'] = self._store.add(GameRecord(
+                self._board.get_size(),
+                self._results['red'],
+                self._players[first.opposite()]['name'],
+                self._moves,
+                swapped=self._has_swapped,
+                end_state=status,
+                winner=self._results['winner'],
+                time=total_time
+            ))
+
+        # close communications; after a normal end, agents in a session
+        # can stay for the next game
+        self._protocol.close(
             kill_children=self._kill_bots,
-            verbose=self._print_protocol
+            verbose=self._print_protocol,
+            keep=(status == EndState.WIN)
         )
 
     def _start_protocol(self, s1, name1, s2, name2):
         """Sets up the TCP server, then starts the agents and
         connects to them. If either connection fails, the game
         will not start.
+
+        Both agents are started before waiting for either of them, so
+        slow starters load in parallel, unless they have to share one
+        fixed port. In-process agents are loaded instead, and no
+        server is set up if both agents are in-process.
         """
-        Protocol.start()
 
-        self._has_connected = Protocol.accept_connection(
-            s1, name1, Game.MAXIMUM_TIME,
-            self._silent_bots, self._print_protocol
-        )
-        if (not self._has_connected):
-            self._players[Colour.RED]['time'] = Game.MAXIMUM_TIME
-            return
+        if (not (InProcessAgent.is_in_process(s1) and
+                 InProcessAgent.is_in_process(s2))):
+            self._protocol.start()
+
+        connected = {}
+        for colour, run_s, name in [
+            (Colour.RED, s1, name1),
+            (Colour.BLUE, s2, name2)
+        ]:
+            if (InProcessAgent.is_in_process(run_s)):
+                connected[colour] = self._attach(run_s, name)
+            else:
+                try:
+                    self._protocol.launch(run_s, name, self._silent_bots)
+                except OSError as e:
+                    # lost by timeout, as when the agent exits at once
+                    print(f"Could not start {name}. Exception raised: {e}")
+                    connected[colour] = False
+                    break
+                if (self._protocol.is_shared_port()):
+                    connected.update(self._protocol.wait_for_connections(
+                        Game.CONNECTION_TIME, self._print_protocol
+                    ))
+
+            if (not connected.get(colour, True)):
+                break
 
-        self._has_connected = Protocol.accept_connection(
-            s2, name2, Game.MAXIMUM_TIME,
-            self._silent_bots, self._print_protocol
-        )
-        if (not self._has_connected):
-            self._players[Colour.BLUE]['time'] = Game.MAXIMUM_TIME
-            self._player = self._player.opposite()
+        connected.update(self._protocol.wait_for_connections(
+            Game.CONNECTION_TIME, self._print_protocol
+        ))
+
+        # if both failed, Red is the one that loses
+        self._has_connected = True
+        for colour in Colour:
+            if (not connected.get(colour, False)):
+                self._has_connected = False
+                self._players[colour]['time'] = self._time_control.total
+                self._player = colour
+                break
+
+    def _attach(self, run_s, name):
+        """Loads an in-process agent. Returns True if it succeeded, False
+        otherwise.
+        """
+
+        try:
+            agent = InProcessAgent.load(run_s)
+        except Exception as e:
+            print(f"Could not load {name}. Exception raised: {e}")
+            return False
+
+        self._protocol.attach_agent(agent, name, self._print_protocol)
+        return True
 
     def _start_log(self):
         """Creates the log file and writes the start message."""
@@ -466,29 +725,49 @@ class Game():
         # create the log directory if it doesn't exist
         Path(log_path).mkdir(parents=True, exist_ok=True)
 
-        # create a new log file
-        self._log_path = log_path + "log.csv"
-        idx = 1
-        while exists(self._log_path):
-            self._log_path = log_path + f"log{idx}.csv"
-            idx += 1
+        # claim a new log file; creating it exclusively keeps games
+        # running in parallel from picking the same name, and the search
+        # resumes where the previous game of this process left off
+        idx = Game._log_index
+        while (True):
+            self._log_path = log_path + "log.csv"
+            if (idx > 0):
+                self._log_path = log_path + f"log{idx}.csv"
+            try:
+                open(self._log_path, "x").close()
+                break
+            except FileExistsError:
+                idx += 1
+        Game._log_index = idx + 1
 
         # submit the start message
-        with open(self._log_path, "w") as f:
-            f.write(f"Start log at {datetime.now()}\n")
-            f.write(
-                f"Board is {self._board.get_size()}x" +
-                f"{self._board.get_size()}.\n"
-            )
-            f.write("No,Player,X,Y,Time\n")
+        self._log_lines = [
+            f"Start log at {datetime.now()}",
+            f"Board is {self._board.get_size()}x{self._board.get_size()}.",
+            "No,Player,X,Y,Time"
+        ]
+        self._flush_log()
 
     def _write_log(self, message):
-        """Writes the specified message and a newline to the log file."""
+        """Adds the specified message and a newline to the log. The log
+        is kept in memory and appended to the file every LOG_BUFFER_LINES
+        rows and at the end of the game.
+        """
         if (not self._log):
             return
 
+        self._log_lines.append(message)
+        if (len(self._log_lines) >= Game.LOG_BUFFER_LINES):
+            self._flush_log()
+
+    def _flush_log(self):
+        """Appends the log kept in memory to the log file and empties it."""
+        if (not self._log or len(self._log_lines) == 0):
+            return
+
         with open(self._log_path, "a") as f:
-            f.write(message + "\n")
+            f.write("\n".join(self._log_lines) + "\n")
+        self._log_lines = []
 
     def get_board(self):
         return self._board
@@ -499,6 +778,12 @@ class Game():
     def get_turn(self):
         return self._turn
 
+    def get_results(self):
+        """Returns the results of a finished game as a dictionary, or None
+        if the game has not ended yet.
+        """
+        return self._results
+
     @staticmethod
     def ns_to_s(t):
         """Method for standardised nanosecond to second conversion."""
@@ -0,0 +1,325 @@
+import os
+import struct
+from glob import glob
+from os.path import join
+
+from EndState import EndState
+
+
+class GameRecord():
+    """The record of one finished game: its moves with their times, the
+    swap flag and the end state.
+
+    red and blue are the names of the agents that started as Red and
+    Blue. Each move is an (x, y, time) tuple with the time in
+    nanoseconds, as in the CSV logs: (-1, -1) is a swap, and (-2, -2) is a
+    badly formatted or missing message, whose time is -1 if the agent
+    timed out. The moves alternate between the two agents, starting with
+    Red.
+    """
+
+    END_STATES = [None, EndState.WIN, EndState.TIMEOUT, EndState.BAD_MOVE]
+
+    # board size, end state, swapped, winner (0 none, 1 red, 2 blue),
+    # number of moves and total time
+    HEADER = struct.Struct("<HBBBHq")
+    MOVE = struct.Struct("<hhq")
+
+    def __init__(
+        self,
+        board_size,
+        red,
+        blue,
+        moves,
+        swapped=False,
+        end_state=None,
+        winner=None,
+        time=0,
+        game_id=None
+    ):
+        super().__init__()
+
+        self.board_size = board_size
+        self.red = red
+        self.blue = blue
+        self.moves = moves
+        self.swapped = swapped
+        self.end_state = end_state
+        self.winner = winner  # name of the winner, or None
+        self.time = time  # total time in nanoseconds
+        self.game_id = game_id  # assigned by GameStore
+
+    def pack(self):
+        """Returns the record in its binary form."""
+
+        winner = 0
+        if (self.winner is not None):
+            winner = 1 if self.winner == self.red else 2
+
+        data = bytearray(GameRecord.HEADER.pack(
+            self.board_size,
+            GameRecord.END_STATES.index(self.end_state),
+            self.swapped,
+            winner,
+            len(self.moves),
+            self.time
+        ))
+        for name in (self.red, self.blue):
+            name = name.encode("utf-8")[:255]
+            data.append(len(name))
+            data += name
+        for x, y, time in self.moves:
+            if (not (-2**15 <= x < 2**15 and -2**15 <= y < 2**15)):
+                # far off the board; only its being illegal matters
+                x, y = -2, -2
+            data += GameRecord.MOVE.pack(x, y, time)
+
+        return bytes(data)
+
+    @staticmethod
+    def unpack(data, game_id=None):
+        """Returns the record stored in the given bytes."""
+
+        board_size, end_state, swapped, winner, n_moves, time = (
+            GameRecord.HEADER.unpack_from(data)
+        )
+        offset = GameRecord.HEADER.size
+
+        names = []
+        for idx in range(2):
+            length = data[offset]
+            names.append(
+                bytes(data[offset + 1:offset + 1 + length]).decode("utf-8")
+            )
+            offset += 1 + length
+
+        moves = [
+            move for move in
+            GameRecord.MOVE.iter_unpack(
+                data[offset:offset + n_moves * GameRecord.MOVE.size]
+            )
+        ]
+
+        return GameRecord(
+            board_size,
+            names[0],
+            names[1],
+            moves,
+            swapped=bool(swapped),
+            end_state=GameRecord.END_STATES[end_state],
+            winner=[None, names[0], names[1]][winner],
+            time=time,
+            game_id=game_id
+        )
+
+
+class GameStore():
+    """An append-only store of game records in a directory.
+
+    Records are buffered in memory and appended to a shard file in bulk.
+    Each writer claims a shard of its own, so several processes can write
+    to the same store at once. Every shard "games<k>.bin" comes with an
+    index "games<k>.idx" of fixed-size (game id, offset, length) entries,
+    which locates a game without reading the shard. Game ids are unique
+    within the store: the shard number in the upper 32 bits, and the
+    position of the game in its shard in the lower 32.
+
+    Records only reach the disk on flush or close, so a writer must be
+    closed when done.
+    """
+
+    # bytes of records held in memory before they are written
+    BUFFER_SIZE = 2**20
+    # a writer starts a new shard once its current one is this large
+    SHARD_SIZE = 2**28
+
+    LENGTH = struct.Struct("<I")
+    INDEX_ENTRY = struct.Struct("<QQI")
+
+    def __init__(self, directory, buffer_size=BUFFER_SIZE):
+        super().__init__()
+
+        self._directory = directory
+        self._buffer_size = buffer_size
+
+        # writer state; a shard is claimed on the first add
+        self._shard = None
+        self._data_file = None
+        self._index_file = None
+        self._offset = 0  # where the buffered records will start
+        self._count = 0  # games in the current shard
+        self._data = bytearray()
+        self._index = bytearray()
+
+        # reader state; loaded on the first get
+        self._locations = None
+
+    def add(self, record):
+        """Buffers a record for writing and returns its game id, which is
+        also set on the record.
+        """
+
+        if (self._shard is None or
+                self._offset + len(self._data) >= GameStore.SHARD_SIZE):
+            self._open_shard()
+
+        data = record.pack()
+        record.game_id = (self._shard << 32) | self._count
+        self._count += 1
+
+        offset = self._offset + len(self._data)
+        self._data += GameStore.LENGTH.pack(len(data))
+        self._data += data
+        self._index += GameStore.INDEX_ENTRY.pack(
+            record.game_id, offset, GameStore.LENGTH.size + len(data)
+        )
+
+        if (len(self._data) >= self._buffer_size):
+            self.flush()
+        return record.game_id
+
+    def flush(self):
+        """Writes the buffered records to disk. The index is written after
+        the records, so it never points past the end of a shard.
+        """
+
+        if (len(self._data) == 0):
+            return
+
+        self._data_file.write(self._data)
+        self._data_file.flush()
+        self._index_file.write(self._index)
+        self._index_file.flush()
+
+        self._offset += len(self._data)
+        self._data = bytearray()
+        self._index = bytearray()
+
+    def close(self):
+        """Writes the remaining records and closes the current shard."""
+
+        self.flush()
+        if (self._data_file is not None):
+            self._data_file.close()
+            self._index_file.close()
+            self._data_file = None
+            self._index_file = None
+
+    def _open_shard(self):
+        """Closes the current shard and claims the first free one. The
+        shard file is created exclusively, so two writers never share
+        one.
+        """
+
+        self.close()
+        os.makedirs(self._directory, exist_ok=True)
+
+        k = 0
+        while (True):
+            try:
+                fd = os.open(
+                    self._path(k, "bin"),
+                    os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                    0o666
+                )
+                break
+            except FileExistsError:
+                k += 1
+
+        self._shard = k
+        self._data_file = os.fdopen(fd, "wb")
+        self._index_file = open(self._path(k, "idx"), "wb")
+        self._offset = 0
+        self._count = 0
+
+    def _path(self, k, extension):
+        return join(self._directory, f"games{k}.{extension}")
+
+    def shards(self):
+        """Returns the numbers of the shards in the store, in order."""
+
+        shards = []
+        for path in glob(join(self._directory, "games*.bin")):
+            name = os.path.basename(path)[len("games"):-len(".bin")]
+            if (name.isdigit()):
+                shards.append(int(name))
+        return sorted(shards)
+
+    def ids(self):
+        """Returns the ids of all games written to disk so far."""
+
+        self._load_index()
+        return list(self._locations.keys())
+
+    def get(self, game_id):
+        """Returns the record of the game with the given id. Raises
+        KeyError if there is no such game.
+        """
+
+        self._load_index()
+        if (game_id not in self._locations):
+            # it may have been written since the index was loaded
+            self._locations = None
+            self._load_index()
+
+        k, offset, length = self._locations[game_id]
+        with open(self._path(k, "bin"), "rb") as f:
+            f.seek(offset + GameStore.LENGTH.size)
+            data = f.read(length - GameStore.LENGTH.size)
+        return GameRecord.unpack(data, game_id)
+
+    def _load_index(self):
+        """Reads the index files of all shards into memory."""
+
+        if (self._locations is not None):
+            return
+
+        self._locations = {}
+        for k in self.shards():
+            path = self._path(k, "idx")
+            if (not os.path.exists(path)):
+                continue
+            with open(path, "rb") as f:
+                data = f.read()
+            # ignore a partly written last entry
+            end = len(data) - len(data) % GameStore.INDEX_ENTRY.size
+            for game_id, offset, length in (
+                GameStore.INDEX_ENTRY.iter_unpack(data[:end])
+            ):
+                self._locations[game_id] = (k, offset, length)
+
+    def shard_records(self, k, start=0):
+        """Yields the records of one shard in the order they were
+        written, beginning with its start-th game. The shard is read
+        sequentially, so only one record is held in memory at a time.
+        """
+
+        offset = 0
+        if (start > 0):
+            # the index tells where that game begins
+            with open(self._path(k, "idx"), "rb") as f:
+                f.seek(start * GameStore.INDEX_ENTRY.size)
+                entry = f.read(GameStore.INDEX_ENTRY.size)
+            if (len(entry) < GameStore.INDEX_ENTRY.size):
+                return
+            _, offset, _ = GameStore.INDEX_ENTRY.unpack(entry)
+
+        with open(self._path(k, "bin"), "rb") as f:
+            f.seek(offset)
+            count = start
+            while (True):
+                header = f.read(GameStore.LENGTH.size)
+                if (len(header) < GameStore.LENGTH.size):
+                    break
+                (length,) = GameStore.LENGTH.unpack(header)
+                data = f.read(length)
+                if (len(data) < length):
+                    break  # partly written record
+                yield GameRecord.unpack(data, (k << 32) | count)
+                count += 1
+
+    def records(self):
+        """Yields every record in the store, shard by shard."""
+
+        for k in self.shards():
+            yield from self.shard_records(k)
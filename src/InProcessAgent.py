@@ -0,0 +1,75 @@
+import sys
+from importlib.util import spec_from_file_location, module_from_spec
+from os.path import basename, dirname, realpath, splitext
+
+
+class InProcessAgent():
+    """The interface of an agent that runs inside the engine process.
+
+    Instead of exchanging protocol text over a socket, the engine calls
+    these hooks directly. Moves are (x, y) tuples, with (-1, -1) standing
+    for a swap, and colours are the protocol characters "R" and "B".
+    Agents do not need to inherit from this class; any object with the
+    same methods will do.
+
+    An in-process agent is selected with a run string of the form
+    "inprocess:<path to python file>:<class name>". The class is
+    instantiated once per game with no arguments.
+    """
+
+    PREFIX = "inprocess:"
+
+    # classes already imported, by run string
+    _classes = {}
+
+    def start(self, board_size, colour):
+        """Called when the game starts, like the START message."""
+        pass
+
+    def on_change(self, move, next_player):
+        """Called after every move, like the CHANGE message. next_player
+        is "R", "B" or "END".
+        """
+        pass
+
+    def get_move(self):
+        """Called when it is the agent's turn. Returns a move."""
+        return (-1, -1)
+
+    def end(self, winner):
+        """Called when the game is over, like the END message. winner is
+        "R", "B" or None.
+        """
+        pass
+
+    @staticmethod
+    def is_in_process(run_s):
+        """Returns True if the run string selects an in-process agent."""
+        return run_s.startswith(InProcessAgent.PREFIX)
+
+    @staticmethod
+    def load(run_s):
+        """Imports the class named by an in-process run string and returns
+        a new instance of it. Each file is only imported once per process.
+
+        The file's directory is added to the module search path, so the
+        agent can import its sibling modules as it would when run as a
+        script.
+        """
+
+        if (run_s in InProcessAgent._classes):
+            return InProcessAgent._classes[run_s]()
+
+        path, class_name = run_s[len(InProcessAgent.PREFIX):].rsplit(":", 1)
+        path = realpath(path)
+
+        directory = dirname(path)
+        if (directory not in sys.path):
+            sys.path.insert(0, directory)
+
+        spec = spec_from_file_location(splitext(basename(path))[0], path)
+        module = module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        InProcessAgent._classes[run_s] = getattr(module, class_name)
+        return InProcessAgent._classes[run_s]()
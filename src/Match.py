@@ -0,0 +1,99 @@
+from Game import Game
+from Protocol import Protocol
+from EndState import EndState
+
+
+class MatchResult():
+    """The outcome of one game of Hex, as returned by run_match.
+
+    Agents are identified by name, since the pie rule may swap their
+    colours during the game. red and blue are the names of the agents that
+    started as Red and Blue.
+    """
+
+    def __init__(self, results, red, blue):
+        """results is the dictionary returned by Game.get_results."""
+
+        self.end_state = results['end state']
+        self.winner = results['winner']
+        self.red = red
+        self.blue = blue
+        self.swapped = results['swapped']
+        self.turns = results['turns']
+        self.time = results['time']  # in nanoseconds
+        self.players = results['players']
+        self.game_id = results['game id']  # None unless stored
+
+    def get_loser(self):
+        """Returns the name of the agent that lost, or None if the game
+        did not finish.
+        """
+
+        if (self.winner is None):
+            return None
+        elif (self.winner == self.red):
+            return self.blue
+        else:
+            return self.red
+
+    def __repr__(self):
+        return (
+            f"MatchResult({self.red} vs {self.blue}: " +
+            f"{EndState.get_text(self.end_state)}, " +
+            f"winner={self.winner}, turns={self.turns})"
+        )
+
+
+def run_match(
+    board_size,
+    red,
+    blue,
+    verbose=False,
+    log=False,
+    print_protocol=False,
+    kill_bots=True,
+    silent_bots=True,
+    bitboard=False,
+    delta=False,
+    port=Protocol.PORT,
+    report=False,
+    pool=None,
+    store=None,
+    time_control=None
+):
+    """Plays one game of Hex between two agents and returns a MatchResult.
+
+    red and blue are dictionaries with the keys 'name' and 'run string',
+    like the players of Game. The other arguments are passed on to Game.
+    Unlike Hex.py, nothing is printed or logged by default, so that a
+    single process can run many matches in a row.
+
+    If an AgentPool is given, agents that support sessions are kept
+    running between matches; see AgentPool. If a GameStore is given, the
+    game is recorded in it. The caller closes the pool and the store when
+    done. time_control is a TimeControl; the default gives each agent 5
+    minutes.
+    """
+
+    if (red['name'] == blue['name']):
+        raise ValueError("Agent names must be unique.")
+
+    g = Game(
+        board_size=board_size,
+        player1=red, player2=blue,
+        verbose=verbose,
+        log=log,
+        print_protocol=print_protocol,
+        kill_bots=kill_bots,
+        silent_bots=silent_bots,
+        bitboard=bitboard,
+        delta=delta,
+        port=port,
+        report=report,
+        pool=pool,
+        store=store,
+        time_control=time_control
+    )
+    g.run()
+
+    return MatchResult(g.get_results(), red['name'], blue['name'])
@@ -1,36 +1,106 @@
+import os
+import selectors
 import socket
 import subprocess
 from sys import platform, stdout
-from time import time_ns
+from time import perf_counter_ns, thread_time_ns
 from Colour import Colour
+from Zygote import Zygote
+from ResourceUsage import ResourceUsage
 import shlex
 
 
 class Protocol():
-    """Static class that handles protocol communication between engine and
-    agents. Uses a TCP socket.
+    """Handles protocol communication between the engine and the two agents
+    of one game. Uses a TCP socket.
+
+    Each instance listens on its own ports, which are assigned by the OS
+    unless one is given, so several games can run on the same machine at
+    once. Agents are told their port through the HEX_PORT environment
+    variable.
+
+    Once connected, the sockets of both agents are watched by one
+    selector, together with their processes. Whatever either agent sends
+    is read as soon as it arrives, so an agent that disconnects or exits
+    is noticed straight away, even while the other one is thinking.
+
+    The selector belongs to one game only, which Game drives with
+    blocking calls, so one process still plays one game at a time;
+    Tournament runs games in parallel with worker processes instead.
+    Multiplexing many games over one selector is out of scope.
     """
 
     HOST = "127.0.0.1"
-    PORT = 1234
-    s = None
-    sockets = {Colour.RED: {}, Colour.BLUE: {}}
+    PORT = 0  # 0 lets the OS pick a free port
+    PORT_VARIABLE = "HEX_PORT"
+
+    # agent messages longer than this are cut off and treated as illegal
+    MAX_MESSAGE_SIZE = 1024
+    # bytes requested per recv call; bursts are split into lines locally
+    RECEIVE_SIZE = 65536
+    # how often to check for agents' processes exiting, in ns
+    POLL_TIME = 10**8
+    # how long to wait for late acknowledgements before keeping an agent
+    # for another game, in ns
+    DRAIN_TIME = 10**6
+    # when moves are timed by CPU time, an agent that is not using the
+    # CPU still times out after this many times its time left
+    CPU_CLOCK_WALL_FACTOR = 10
+
+    def __init__(self, port=PORT, pool=None):
+        """If an AgentPool is given, agents are taken from it when
+        possible, and agents that accepted the SESSION capability can be
+        returned to it by close.
+        """
+
+        super().__init__()
+
+        self._port = port
+        self._pool = pool
+        self.s = None
+        self.sockets = {Colour.RED: {}, Colour.BLUE: {}}
+        # connected agents' sockets; the data of each key is the agent's
+        # entry in self.sockets, which stays the same when colours swap
+        self._selector = selectors.DefaultSelector()
+
+    def start(self):
+        """Sets up a TCP server, shared by both agents, if a fixed port was
+        given. The socket reuse address option is enabled because Linux
+        does not close sockets immediately on application exit. This would
+        cause issues with successive matches.
+
+        With an OS-assigned port, every agent gets its own listening
+        socket in launch instead, so that the agents can be started at
+        the same time and still be told apart when they connect.
+        """
+
+        if (not self.is_shared_port()):
+            return
 
-    @staticmethod
-    def start():
-        """Sets up a TCP server. The socket reuse address option is
-        enabled because Linux does not close sockets immediately on
-        application exit. This would cause issues with successive
-        matches.
+        self.s = self._listen(self._port)
+        self._port = self.s.getsockname()[1]
+
+    def get_port(self):
+        return self._port
+
+    def is_shared_port(self):
+        """Returns True if all agents connect to the same fixed port, and
+        therefore have to be connected one at a time.
         """
 
-        Protocol.s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        Protocol.s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        Protocol.s.bind((Protocol.HOST, Protocol.PORT))
-        Protocol.s.listen()
+        return self._port != Protocol.PORT
+
+    def _listen(self, port):
+        """Returns a new listening socket bound to the given port."""
+
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.bind((Protocol.HOST, port))
+        s.listen()
+        return s
 
-    @staticmethod
     def accept_connection(
+        self,
         run_s,
         name,
         timeout_ns=30*10**9,
@@ -42,17 +112,44 @@ class Protocol():
         was made, False otherwise.
         """
 
+        colour = self.launch(run_s, name, silent)
+        return self.wait_for_connections(timeout_ns, verbose)[colour]
+
+    def launch(self, run_s, name, silent=True):
+        """Starts a subprocess with the specified string without waiting
+        for it to connect; see wait_for_connections. Returns the colour
+        assigned to the new agent. Raises OSError if the agent cannot be
+        started, for example a forked agent that cannot be imported.
+
+        If the pool has an idle agent with the same run string, that agent
+        is told a new game follows and used instead. Run strings starting
+        with Zygote.PREFIX are forked from a zygote instead of started
+        from scratch.
+        """
+
+        colour = self._next_colour()
+
+        if (self._pool is not None):
+            x = self._pool.take(run_s)
+            if (x is not None):
+                self.sockets[colour] = x
+                x['name'] = name
+                x['capabilities'] = set()
+                x['usage'].reset_peak_memory()
+                self._selector.register(x['conn'], selectors.EVENT_READ, x)
+                self.send_message(colour, "NEWGAME\n")
+                return colour
+
         # separate run_s into a list of arguments to be used in a linux shell
+        args = run_s
         if (platform != "win32"):
-            run_s = shlex.split(run_s)
+            args = shlex.split(run_s)
 
-        # determine the colour of the new agent
-        if len(Protocol.sockets[Colour.RED].keys()) == 0:
-            colour = Colour.RED
-        elif len(Protocol.sockets[Colour.BLUE].keys()) == 0:
-            colour = Colour.BLUE
-        else:
-            raise ValueError("Too many agents specified.")
+        # the agent's listening socket tells its connection apart from
+        # the other agent's
+        listener = self.s
+        if (not self.is_shared_port()):
+            listener = self._listen(Protocol.PORT)
 
         # whether to throw out all output of the agent
         # used to ease the screen clutter during the tournament
@@ -60,79 +157,437 @@ class Protocol():
         if (silent):
             output = subprocess.DEVNULL
 
-        # start the agent
-        t = subprocess.Popen(run_s, stdout=output, stderr=output, shell=False)
+        # start the agent, telling it which port to connect to
+        port = listener.getsockname()[1]
+        try:
+            if (Zygote.is_forked(run_s)):
+                t = Zygote.get(run_s, silent).fork(port)
+            else:
+                env = dict(os.environ)
+                env[Protocol.PORT_VARIABLE] = str(port)
+                t = subprocess.Popen(
+                    args, stdout=output, stderr=output, shell=False, env=env
+                )
+        except OSError:
+            if (listener is not self.s):
+                listener.close()
+            raise
+
+        # set up associated arguments
+        self.sockets[colour]['name'] = name
+        self.sockets[colour]['run string'] = run_s
+        self.sockets[colour]['thread'] = t
+        self.sockets[colour]['conn'] = None
+        self.sockets[colour]['addr'] = None
+        self.sockets[colour]['capabilities'] = set()
+        self.sockets[colour]['buffer'] = bytearray()
+        self.sockets[colour]['closed'] = False
+        self.sockets[colour]['usage'] = ResourceUsage(t.pid)
+        self.sockets[colour]['agent'] = None
+        self.sockets[colour]['listener'] = listener
+
+        return colour
+
+    def wait_for_connections(self, timeout_ns=30*10**9, verbose=False):
+        """Waits for all launched agents to connect, accepting connections
+        in whatever order they arrive. Agents whose process exits before
+        connecting are given up on straight away. Returns a dictionary
+        from the colour of each of these agents to True if it connected,
+        False otherwise. Agents taken from the pool count as connected.
+        """
+
+        selector = selectors.DefaultSelector()
+        for colour in Colour:
+            if (self.sockets[colour].get('listener') is not None):
+                selector.register(
+                    self.sockets[colour]['listener'],
+                    selectors.EVENT_READ, colour
+                )
+
+        connected = {}
+        deadline = perf_counter_ns() + timeout_ns
+        while (len(selector.get_map()) > 0):
+            remaining = deadline - perf_counter_ns()
+            if (remaining <= 0):
+                break
+
+            # wake up regularly to notice agents that have exited
+            wait = min(remaining, Protocol.POLL_TIME)
+            for key, _ in selector.select(wait/10**9):
+                colour = key.data
+                conn, addr = key.fileobj.accept()
+                # messages are tiny and sent back to back; without this,
+                # Nagle's algorithm holds some of them until the agent's
+                # delayed ACK arrives, adding ~40ms to many moves
+                conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self.sockets[colour]['conn'] = conn
+                self.sockets[colour]['addr'] = addr
+                self._selector.register(
+                    conn, selectors.EVENT_READ, self.sockets[colour]
+                )
+                connected[colour] = True
+                selector.unregister(key.fileobj)
+                if verbose:
+                    print(f"Connected {self.sockets[colour]['name']} " +
+                          f"at {addr}")
+
+            for key in list(selector.get_map().values()):
+                if (self.sockets[key.data]['thread'].poll() is not None):
+                    selector.unregister(key.fileobj)
+
+        selector.close()
+
+        for colour in Colour:
+            x = self.sockets[colour]
+            if (x.get('listener') is None):
+                if (x.get('conn') is not None):
+                    connected.setdefault(colour, True)
+                continue
+            if (x['listener'] is not self.s):
+                x['listener'].close()
+            x['listener'] = None
+
+            if (colour not in connected):
+                connected[colour] = False
+                if (verbose):
+                    print(f"{x['name']} never connected.")
+
+        return connected
+
+    def attach_agent(self, agent, name, verbose=False):
+        """Registers an in-process agent (see InProcessAgent) in place of a
+        subprocess. The engine talks to it through get_agent instead of
+        sending and receiving protocol messages.
+        """
+
+        colour = self._next_colour()
+
+        self.sockets[colour]['name'] = name
+        self.sockets[colour]['run string'] = None
+        self.sockets[colour]['thread'] = None
+        self.sockets[colour]['conn'] = None
+        self.sockets[colour]['addr'] = None
+        self.sockets[colour]['capabilities'] = set()
+        self.sockets[colour]['buffer'] = bytearray()
+        self.sockets[colour]['closed'] = False
+        self.sockets[colour]['usage'] = None
+        self.sockets[colour]['cpu time'] = 0  # measured in get_move
+        self.sockets[colour]['agent'] = agent
+        self.sockets[colour]['listener'] = None
+
+        if (verbose):
+            print(f"Attached {name} in process")
+
+    def _next_colour(self):
+        """Returns the colour of the next agent to be connected."""
+
+        if len(self.sockets[Colour.RED].keys()) == 0:
+            return Colour.RED
+        elif len(self.sockets[Colour.BLUE].keys()) == 0:
+            return Colour.BLUE
+        else:
+            raise ValueError("Too many agents specified.")
+
+    def get_agent(self, colour):
+        """Returns the in-process agent playing the given colour, or None if
+        that agent runs in its own process.
+        """
+
+        return self.sockets[colour].get('agent')
+
+    def get_cpu_time(self, colour):
+        """Returns the CPU time used so far by the given colour agent, in
+        nanoseconds, or None if it cannot be measured. For in-process
+        agents, this is the time spent in their get_move.
+        """
+
+        x = self.sockets[colour]
+        if (x.get('agent') is not None):
+            return x['cpu time']
+        if (x.get('usage') is None):
+            return None
+        return x['usage'].get_cpu_time()
+
+    def get_peak_memory(self, colour):
+        """Returns the peak memory used by the given colour agent's process
+        during this game, in bytes, or None if it cannot be measured, as
+        for in-process agents.
+        """
+
+        usage = self.sockets[colour].get('usage')
+        if (usage is None):
+            return None
+        return usage.get_peak_memory()
+
+    def notify_agent(self, colour, hook, *args, verbose=False):
+        """Calls the named hook of the given colour in-process agent with
+        the given arguments. Failures are reported like failed sends.
+        """
 
-        # wait for a connection
         try:
-            Protocol.s.settimeout(timeout_ns/10**9)
-            conn, addr = Protocol.s.accept()
-            Protocol.s.settimeout(socket.getdefaulttimeout())
+            getattr(self.sockets[colour]['agent'], hook)(*args)
+        except Exception as e:
             if verbose:
-                print(f"Connected {name} at {addr}")
-        except socket.timeout:
-            conn, addr = None, None
-            if (verbose):
-                print(f"{name} never connected.")
+                print(
+                    f"Failed to call {hook} on " +
+                    f"{self.sockets[colour]['name']}. Exception raised: {e}"
+                )
 
-        # set up associated arguments
-        Protocol.sockets[colour]['name'] = name
-        Protocol.sockets[colour]['thread'] = t
-        Protocol.sockets[colour]['conn'] = conn
-        Protocol.sockets[colour]['addr'] = addr
+    def get_move(
+        self,
+        colour,
+        timeout_ns=30*10**9,
+        verbose=False,
+        cpu_clock=False
+    ):
+        """Asks the given colour in-process agent for its move. Returns the
+        move and the time taken, like get_message.
+
+        The call cannot be interrupted, so an agent that overruns the
+        time left is only reported as timed out once it returns. If the
+        agent raises an exception, its text is returned as the move.
+        """
+
+        agent = self.sockets[colour]['agent']
+        move_time = perf_counter_ns()
+        cpu_time = thread_time_ns()
+        try:
+            move = agent.get_move()
+            if (not isinstance(move, tuple)):
+                move = str(move)
+        except Exception as e:
+            move = f"{type(e).__name__}: {e}"
+        move_time = perf_counter_ns() - move_time
+        cpu_time = thread_time_ns() - cpu_time
+        self.sockets[colour]['cpu time'] += cpu_time
+        if (cpu_clock):
+            move_time = cpu_time
+
+        if (move_time > timeout_ns):
+            if verbose:
+                print(f"{self.sockets[colour]['name']} timed out.")
+            return ("NO MESSAGE", -1)
+
+        if verbose:
+            print(
+                f"Received {move} from " +
+                f"{self.sockets[colour]['name']} in " +
+                f"~{int(move_time/10**4)/10**5}s."
+            )
 
-        return conn is not None
+        return (move, move_time)
 
-    @staticmethod
-    def get_message(colour, timeout_ns=30*10**9, verbose=False):
+    def get_message(
+        self,
+        colour,
+        timeout_ns=30*10**9,
+        verbose=False,
+        cpu_clock=False
+    ):
         """Waits for a message from the given colour agent for the specified
         length of time. Returns the text and the associated wait time.
+
+        If cpu_clock=True, the time is the CPU time the agent used instead,
+        and the agent times out once it has used the specified CPU time,
+        or CPU_CLOCK_WALL_FACTOR times as much wall-clock time. This needs
+        get_cpu_time to work for the agent.
+
+        Messages are newline-terminated, so several of them may arrive in
+        one segment or one of them may be split across segments. Capability
+        acknowledgements (see acknowledge) that arrive before the message
+        are consumed here and do not count as a move.
+
+        If the other agent disconnects in the meantime, the wait stops at
+        once and no message is returned either; see has_disconnected.
         """
 
+        other = colour.opposite()
         try:
-            Protocol.sockets[colour]['conn'].settimeout(timeout_ns/10**9)
-            move_time = time_ns()
-            data = Protocol.sockets[colour]['conn'].recv(1024)
-            move_time = time_ns() - move_time
-            Protocol.sockets[colour]['conn'].settimeout(
-                socket.getdefaulttimeout()
-            )
+            move_time = perf_counter_ns()
+            deadline = move_time + timeout_ns
+            cpu_deadline = None
+            if (cpu_clock):
+                deadline = (
+                    move_time + timeout_ns * Protocol.CPU_CLOCK_WALL_FACTOR
+                )
+                cpu_time = self.get_cpu_time(colour)
+                cpu_deadline = cpu_time + timeout_ns
+
+            text = self._read_line(
+                colour, deadline, other, cpu_deadline
+            ).decode("utf-8")
+            while (text.startswith("ACK;")):
+                self.acknowledge(colour, text)
+                text = self._read_line(
+                    colour, deadline, other, cpu_deadline
+                ).decode("utf-8")
+            move_time = perf_counter_ns() - move_time
+
+            if (cpu_clock):
+                # the agent may have run over since it was last checked
+                move_time = (self.get_cpu_time(colour) or 0) - cpu_time
+                if (move_time > timeout_ns):
+                    raise socket.timeout()
 
         except socket.timeout:
             if verbose:
                 print(
-                    f"{Protocol.sockets[colour]['name']} timed out. " +
+                    f"{self.sockets[colour]['name']} timed out. " +
                     "Nothing received."
                 )
             return ("NO MESSAGE", -1)
         except ConnectionResetError:
             if verbose:
                 print(
-                    f"{Protocol.sockets[colour]['name']} disconnected early.")
+                    f"{self.sockets[colour]['name']} disconnected early.")
+            return ("NO MESSAGE", -1)
+        except ConnectionAbortedError:
+            if verbose:
+                print(
+                    f"{self.sockets[other]['name']} disconnected while " +
+                    f"{self.sockets[colour]['name']} was thinking."
+                )
             return ("NO MESSAGE", -1)
         except Exception:
             if verbose:
                 print(
-                    f"{Protocol.sockets[colour]['name']} socket " +
+                    f"{self.sockets[colour]['name']} socket " +
                     "ended unexpectedly."
                 )
             return ("NO MESSAGE", -1)
 
         if verbose:
             print(
-                f"Received {data.decode('utf-8').strip()} from " +
-                f"{Protocol.sockets[colour]['name']} in " +
+                f"Received {text.strip()} from " +
+                f"{self.sockets[colour]['name']} in " +
                 f"~{int(move_time/10**4)/10**5}s."
             )
 
-        return (data.decode("utf-8"), move_time)
+        return (text, move_time)
+
+    def _read_line(self, colour, deadline, watch=None, cpu_deadline=None):
+        """Returns the next line sent by the given colour agent, including
+        its newline. Whatever follows it stays buffered for the next call.
+
+        A line longer than MAX_MESSAGE_SIZE is returned as soon as that
+        many bytes have arrived, and the rest of the buffer is returned if
+        the agent disconnects. Raises socket.timeout if the deadline (in
+        nanoseconds) passes first, or the agent's CPU time reaches
+        cpu_deadline, if given. Raises ConnectionAbortedError if the
+        agent of the watch colour, if given, disconnects first.
+        """
+
+        x = self.sockets[colour]
+        buffer = x['buffer']
+
+        while (True):
+            end = buffer.find(b"\n")
+            if (end != -1):
+                line = bytes(buffer[:end + 1])
+                del buffer[:end + 1]
+                return line
+
+            if (len(buffer) >= Protocol.MAX_MESSAGE_SIZE):
+                line = bytes(buffer)
+                buffer.clear()
+                return line
+
+            if (x['closed']):
+                # hand over what is left
+                line = bytes(buffer)
+                buffer.clear()
+                return line
+
+            if (watch is not None and self.has_disconnected(watch)):
+                raise ConnectionAbortedError()
+
+            remaining = deadline - perf_counter_ns()
+            if (remaining <= 0):
+                raise socket.timeout()
+            if (cpu_deadline is not None and
+                    (self.get_cpu_time(colour) or 0) >= cpu_deadline):
+                raise socket.timeout()
+            self._receive(remaining)
+
+    def _receive(self, timeout_ns):
+        """Waits up to the given time, in nanoseconds, for either agent to
+        send something, and reads whatever has arrived into the agents'
+        buffers. Agents whose connection has closed, or whose process
+        has exited, are marked as disconnected.
+        """
+
+        # an exited agent's last messages are already queued on its
+        # socket, so they are read below before it is given up on; its
+        # socket may stay open if the agent started processes of its own
+        exited = [
+            key.data for key in self._selector.get_map().values()
+            if (key.data['thread'].poll() is not None)
+        ]
+
+        wait = 0
+        if (len(exited) == 0):
+            wait = min(timeout_ns, Protocol.POLL_TIME)
+
+        ready = []
+        for key, _ in self._selector.select(wait/10**9):
+            x = key.data
+            ready.append(x)
+            try:
+                data = key.fileobj.recv(Protocol.RECEIVE_SIZE)
+            except OSError:
+                data = b""
+
+            if (data):
+                x['buffer'] += data
+            else:
+                self._disconnect(x)
+
+        for x in exited:
+            if (not any(x is y for y in ready)):
+                self._disconnect(x)
+
+    def _disconnect(self, x):
+        """Marks an agent, given by its entry in self.sockets, as
+        disconnected and stops watching its socket.
+        """
+
+        x['closed'] = True
+        try:
+            self._selector.unregister(x['conn'])
+        except (KeyError, ValueError):
+            pass
+
+    def has_disconnected(self, colour):
+        """Returns True if the given colour agent has closed its connection
+        or exited.
+        """
+
+        return self.sockets[colour].get('closed', False)
+
+    def acknowledge(self, colour, line):
+        """Records the capabilities accepted by the given colour agent.
 
-    @staticmethod
-    def send_message(colour, message, verbose=False):
+        The engine offers optional protocol capabilities in the START
+        message as "START;n;<COLOUR>;<CAP>(,<CAP>)*". An agent accepts
+        them by sending "ACK;<CAP>(,<CAP>)*" on its own line before its
+        next move.
+        """
+
+        for capability in line.strip().split(";")[1].split(","):
+            self.sockets[colour]['capabilities'].add(capability)
+
+    def has_capability(self, colour, capability):
+        """Returns True if the given colour agent has accepted the given
+        protocol capability.
+        """
+
+        return capability in self.sockets[colour].get('capabilities', ())
+
+    def send_message(self, colour, message, verbose=False):
         """Sends the specified message to the specified colour agent."""
 
         try:
-            Protocol.sockets[colour]['conn'].sendall(bytes(message, "utf-8"))
+            self.sockets[colour]['conn'].sendall(bytes(message, "utf-8"))
             if verbose:
                 print("Sent", message, end="")
 
@@ -140,34 +595,84 @@ class Protocol():
             if verbose:
                 print(
                     f"Failed to send {message.strip()} to " +
-                    f"{Protocol.sockets[colour]['name']}."
+                    f"{self.sockets[colour]['name']}."
                 )
 
-    @staticmethod
-    def swap():
+    def _keep(self, colour):
+        """Returns the given colour agent to the pool if it can play
+        another game. Returns True if it did, False otherwise.
+
+        Acknowledgements still in transit are read first; any other
+        message, or a closed connection, means the agent is not in a
+        state to start over.
+        """
+
+        x = self.sockets[colour]
+        if (self._pool is None or x['conn'] is None or
+                x['closed'] or x['thread'].poll() is not None):
+            return False
+
+        try:
+            while (True):
+                text = self._read_line(
+                    colour, perf_counter_ns() + Protocol.DRAIN_TIME
+                ).decode("utf-8")
+                if (not text.startswith("ACK;")):
+                    return False
+                self.acknowledge(colour, text)
+        except socket.timeout:
+            pass
+        except Exception:
+            return False
+
+        if (len(x['buffer']) > 0 or x['closed'] or
+                not self.has_capability(colour, "SESSION")):
+            return False
+
+        # the next game's Protocol watches it from now on
+        self._selector.unregister(x['conn'])
+        self._pool.put(x['run string'], x)
+        return True
+
+    def swap(self):
         """Switches the colours of the two agents."""
 
-        Protocol.sockets[Colour.RED], Protocol.sockets[Colour.BLUE] = \
-            Protocol.sockets[Colour.BLUE], Protocol.sockets[Colour.RED]
+        self.sockets[Colour.RED], self.sockets[Colour.BLUE] = \
+            self.sockets[Colour.BLUE], self.sockets[Colour.RED]
 
-    @staticmethod
-    def close(kill_children=True, verbose=False):
+    def close(self, kill_children=True, verbose=False, keep=False):
         """Closes the connection. If kill_children=True, it will also forcibly
         terminate the agents. Otherwise, it will block the thread until they
         have terminated on their own.
+
+        If keep=True, agents that accepted the SESSION capability and have
+        sent nothing unexpected are returned to the pool instead.
         """
 
         # close sockets and agents
         for colour in Colour:
-            x = Protocol.sockets[colour]
+            x = self.sockets[colour]
             if (len(x.keys()) == 0):
                 continue
 
+            if (x['agent'] is not None):
+                # nothing to close for in-process agents
+                continue
+
+            if (keep and self._keep(colour)):
+                if (verbose):
+                    print(f"Kept {x['name']} for the next game")
+                continue
+
+            if (x['listener'] is not None and x['listener'] is not self.s):
+                x['listener'].close()
+
             try:
                 if (kill_children):
                     x['thread'].kill()
-                else:
-                    x['thread'].wait()
+                # reap the process so long-running callers do not collect
+                # zombies
+                x['thread'].wait()
             except Exception as e:
                 if (verbose):
                     print(
@@ -176,6 +681,7 @@ class Protocol():
                     )
 
             try:
+                self._disconnect(x)
                 x['conn'].close()
                 if (verbose):
                     print(
@@ -186,29 +692,29 @@ class Protocol():
                     print(
                         f"{x['name']} connection was already closed.")
 
-        # close server
-        try:
-            Protocol.s.close()
-        except AttributeError:
-            if (verbose):
-                print("Socket was not open.")
+        self._selector.close()
+
+        # close the shared server, if there is one
+        if (self.s is not None):
+            self.s.close()
 
 
 if __name__ == "__main__":
     commands = [
         "echo Hello 1",
         "echo Hello 2",
-        "python agents/NaiveAgent.py"
+        "python agents/DefaultAgents/NaiveAgent.py"
     ]
 
-    Protocol.start()
+    p = Protocol()
+    p.start()
 
-    Protocol.accept_connection(commands[2], verbose=True)
-    Protocol.accept_connection(commands[2], verbose=True)
-    Protocol.send_message(Colour.RED, "START;2;R", verbose=True)
-    Protocol.get_message(Colour.RED, verbose=True)
-    Protocol.send_message(Colour.BLUE, "START;2;B", verbose=True)
-    Protocol.send_message(Colour.RED, "END", verbose=True)
-    Protocol.send_message(Colour.BLUE, "END", verbose=True)
+    p.accept_connection(commands[2], "Alice", verbose=True)
+    p.accept_connection(commands[2], "Bob", verbose=True)
+    p.send_message(Colour.RED, "START;2;R\n", verbose=True)
+    p.get_message(Colour.RED, verbose=True)
+    p.send_message(Colour.BLUE, "START;2;B\n", verbose=True)
+    p.send_message(Colour.RED, "END\n", verbose=True)
+    p.send_message(Colour.BLUE, "END\n", verbose=True)
 
-    Protocol.close()
+    p.close(verbose=True)
@@ -0,0 +1,345 @@
+"""This script replays recorded games of Hex to check them.
+
+Every game is played again from its record, without agents or sockets,
+to verify that each move was legal and that the recorded end state and
+winner are the ones the moves lead to. Records are read from the CSV logs
+written with "-log" and from GameStore directories. Files are spread
+over a pool of worker processes.
+
+Possible arguments:
+* Any number of paths. A directory holding a GameStore is read as one;
+any other directory is searched for CSV logs, and a file is read as a
+CSV log.
+* "processes=n" sets the number of worker processes (default: one per
+CPU core).
+* "out=path" writes a summary of every game to the given CSV file.
+* "-verbose" or "-v" prints a summary of every game, not only of those
+that failed the check.
+"""
+import os
+from sys import argv
+from glob import glob
+from os.path import isdir, join
+from multiprocessing import Pool
+
+from Tile import Tile
+from EndState import EndState
+from UnionFind import UnionFind
+from GameStore import GameRecord, GameStore
+
+
+# neighbours of every tile, by board size
+_neighbours = {}
+
+# CSV logs handed to a worker at once
+CSV_BATCH_SIZE = 256
+
+SUMMARY_HEADER = (
+    "Source,Board size,Red,Blue,Turns,Swapped,End state,Winner,Valid,Error"
+)
+
+
+def _get_neighbours(n):
+    """Returns, for every tile index x*n + y, the indices of the adjacent
+    tiles, and the virtual side nodes it touches for each colour: n*n
+    (top) and n*n+1 (bottom) for Red, n*n+2 (left) and n*n+3 (right) for
+    Blue.
+    """
+
+    if (n not in _neighbours):
+        neighbours = []
+        for x in range(n):
+            for y in range(n):
+                adjacent = []
+                for idx in range(Tile.NEIGHBOUR_COUNT):
+                    x_n = x + Tile.I_DISPLACEMENTS[idx]
+                    y_n = y + Tile.J_DISPLACEMENTS[idx]
+                    if (0 <= x_n < n and 0 <= y_n < n):
+                        adjacent.append(x_n * n + y_n)
+                sides = {1: [], 2: []}
+                if (x == 0):
+                    sides[1].append(n * n)
+                if (x == n - 1):
+                    sides[1].append(n * n + 1)
+                if (y == 0):
+                    sides[2].append(n * n + 2)
+                if (y == n - 1):
+                    sides[2].append(n * n + 3)
+                neighbours.append((adjacent, sides))
+        _neighbours[n] = neighbours
+
+    return _neighbours[n]
+
+
+def replay(record):
+    """Plays a recorded game again by the rules of Game. Returns a tuple
+    (end state, winner, error), where error is None if the record agrees
+    with the replay, or a description of the first difference.
+
+    Only the tiles and their connectivity are kept, the same way as in
+    Board, so no Board, Tile or protocol text is built.
+    """
+
+    n = record.board_size
+    neighbours = _get_neighbours(n)
+    top, bottom, left, right = n * n, n * n + 1, n * n + 2, n * n + 3
+
+    tiles = [0] * (n * n)  # 0 empty, 1 red, 2 blue
+    groups = UnionFind(n * n + 4)
+
+    # agents by the colour they play; the pie rule swaps them
+    agents = {1: record.red, 2: record.blue}
+    colour = 1
+    end_state = None
+    winner = None
+    error = None
+
+    for turn, (x, y, move_time) in enumerate(record.moves, 1):
+        if (end_state is not None):
+            error = f"turn {turn} was played after the end of the game"
+            break
+
+        if (move_time == -1):
+            end_state = EndState.TIMEOUT
+            winner = agents[3 - colour]
+        elif (x == -1 and y == -1 and turn == 2):
+            agents[1], agents[2] = agents[2], agents[1]
+            # the swapping agent plays on as Red, so Blue moves next
+            colour = 1
+        elif (0 <= x < n and 0 <= y < n and tiles[x * n + y] == 0):
+            idx = x * n + y
+            tiles[idx] = colour
+            adjacent, sides = neighbours[idx]
+            for neighbour in adjacent:
+                if (tiles[neighbour] == colour):
+                    groups.union(idx, neighbour)
+            for side in sides[colour]:
+                groups.union(idx, side)
+
+            if (colour == 1 and groups.connected(top, bottom) or
+                    colour == 2 and groups.connected(left, right)):
+                end_state = EndState.WIN
+                winner = agents[colour]
+        else:
+            end_state = EndState.BAD_MOVE
+            winner = agents[3 - colour]
+
+        colour = 3 - colour
+
+    if (len(record.moves) == 0 and record.end_state == EndState.TIMEOUT):
+        # an agent never connected; which one is not in the record
+        end_state, winner = record.end_state, record.winner
+    elif (end_state is None and record.end_state == EndState.TIMEOUT):
+        # the agent not to move disconnected while the other was thinking
+        end_state, winner = EndState.TIMEOUT, agents[colour]
+
+    if (error is None):
+        if (end_state != record.end_state):
+            error = (
+                f"recorded {EndState.get_text(record.end_state)}; " +
+                f"replayed {EndState.get_text(end_state)}"
+            )
+        elif (winner != record.winner):
+            error = f"recorded winner {record.winner}; replayed {winner}"
+        elif (len(record.moves) > 1 and
+                record.swapped != (record.moves[1][:2] == (-1, -1))):
+            error = "swap flag does not match the moves"
+
+    return (end_state, winner, error)
+
+
+def read_csv(path):
+    """Returns the GameRecord of a CSV log written by Game. Raises
+    ValueError if the file is not in that format.
+    """
+
+    with open(path) as f:
+        lines = f.read().splitlines()
+
+    try:
+        n = int(lines[1].split(" ")[2].split("x")[0])
+        moves = []
+        names = []
+        end = None
+        total_time = 0
+        for line in lines[3:]:
+            if (line == ""):
+                continue
+            parts = line.split(",")
+
+            if (parts[0] != "0"):
+                # turn,name,x,y,time; only the name may contain commas
+                x, y, move_time = parts[-3], parts[-2], int(parts[-1])
+                if (x == "-1"):
+                    moves.append((-1, -1, move_time))
+                elif (x == "-2"):
+                    moves.append((-2, -2, move_time))
+                else:
+                    moves.append((int(x), int(y), move_time))
+            elif (parts[-1] == "Usage"):
+                # CPU time and peak memory, not needed for a replay
+                continue
+            elif (parts[-3] == "End" or
+                    parts[1:] == ["None", "End", "Unknown error"]):
+                # winner,End,cause,swapped; counted from the right, as
+                # the winner's name may contain commas
+                end = parts
+            elif (parts[1] == "Total"):
+                total_time = int(parts[3])
+            else:
+                # per-agent totals, in the order of their final colours
+                names.append(",".join(parts[1:-3]))
+    except (IndexError, ValueError):
+        raise ValueError(f"{path} is not a game log.")
+
+    if (end is None or len(names) != 2):
+        raise ValueError(f"{path} is not a complete game log.")
+
+    swapped = len(moves) > 1 and moves[1][:2] == (-1, -1)
+    if (swapped):
+        names.reverse()
+
+    end_states = {
+        "Win": EndState.WIN,
+        "Timeout": EndState.TIMEOUT,
+        "Illegal move": EndState.BAD_MOVE
+    }
+    end_state = end_states.get(end[-2])
+    winner = None
+    if (end_state is not None):
+        winner = ",".join(end[1:-3])
+
+    return GameRecord(
+        n, names[0], names[1], moves,
+        swapped=swapped,
+        end_state=end_state,
+        winner=winner,
+        time=total_time
+    )
+
+
+def _summarise(source, record):
+    """Replays a record and returns its summary as a CSV line, and whether
+    it passed the check.
+    """
+
+    end_state, winner, error = replay(record)
+    valid = error is None
+    if (error is None):
+        error = ""
+    return (
+        f"{source},{record.board_size},{record.red},{record.blue}," +
+        f"{len(record.moves)},{record.swapped}," +
+        f"{EndState.get_text(end_state)},{winner},{valid},{error}",
+        valid
+    )
+
+
+def _check(unit):
+    """Checks one unit of work in a worker process: either a batch of CSV
+    logs or one shard of a GameStore. Returns a list of summaries.
+    """
+
+    summaries = []
+    if (unit[0] == "csv"):
+        for path in unit[1]:
+            try:
+                record = read_csv(path)
+            except (OSError, ValueError) as e:
+                summaries.append((f"{path},,,,,,,,False,{e}", False))
+                continue
+            summaries.append(_summarise(path, record))
+    else:
+        directory, k = unit[1], unit[2]
+        for record in GameStore(directory).shard_records(k):
+            summaries.append(_summarise(
+                f"{directory}#{record.game_id}", record
+            ))
+
+    return summaries
+
+
+def get_units(paths):
+    """Splits the given paths into units of work for the workers."""
+
+    units = []
+    csv_paths = []
+    for path in paths:
+        if (isdir(path) and len(glob(join(path, "games*.bin"))) > 0):
+            for k in GameStore(path).shards():
+                units.append(("store", path, k))
+        elif (isdir(path)):
+            csv_paths += sorted(
+                glob(join(path, "**", "*.csv"), recursive=True)
+            )
+        else:
+            csv_paths.append(path)
+
+    for idx in range(0, len(csv_paths), CSV_BATCH_SIZE):
+        units.append(("csv", csv_paths[idx:idx + CSV_BATCH_SIZE]))
+
+    return units
+
+
+def check(paths, processes=None, out=None, verbose=False):
+    """Replays every game found in the given paths on a pool of worker
+    processes. Writes the summaries to out, an open file, if given.
+    Returns the number of games checked and the number that failed.
+    """
+
+    games = 0
+    failed = 0
+    if (out is not None):
+        out.write(SUMMARY_HEADER + "\n")
+
+    with Pool(processes or os.cpu_count()) as pool:
+        for summaries in pool.imap_unordered(_check, get_units(paths)):
+            for line, valid in summaries:
+                games += 1
+                if (not valid):
+                    failed += 1
+                if (verbose or not valid):
+                    print(line)
+            if (out is not None):
+                out.write("".join(line + "\n" for line, _ in summaries))
+
+    return (games, failed)
+
+
+def main():
+    paths = []
+    processes = None
+    out_path = None
+    verbose = False
+
+    for argument in argv[1:]:
+        if (argument.startswith("processes=")):
+            try:
+                processes = int(argument.split("=")[1])
+            except ValueError:
+                print(
+                    f"ERROR: Argument '{argument}' is not in valid " +
+                    "format. Aborted."
+                )
+                return
+        elif (argument.startswith("out=")):
+            out_path = argument.split("=", 1)[1]
+        elif (argument in ("-v", "-verbose")):
+            verbose = True
+        else:
+            paths.append(argument)
+
+    out = None
+    if (out_path is not None):
+        out = open(out_path, "w")
+    try:
+        games, failed = check(paths, processes, out, verbose)
+    finally:
+        if (out is not None):
+            out.close()
+
+    print(f"Checked {games} games: {games - failed} passed, {failed} failed.")
+
+
+if __name__ == "__main__":
+    main()
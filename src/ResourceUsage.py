@@ -0,0 +1,72 @@
+import os
+
+
+class ResourceUsage():
+    """Reads the CPU time and peak memory of an agent's process from
+    /proc, so that agents can be compared by the work they do rather than
+    by the wall-clock time they take on a busy machine.
+
+    The CPU time includes every thread of the agent, and its child
+    processes once they have exited. /proc only exists on Linux;
+    elsewhere, or once the process is gone, the readings are None.
+    """
+
+    # the kernel counts CPU time in clock ticks, usually of 10ms
+    try:
+        TICK = 10**9 // os.sysconf("SC_CLK_TCK")
+    except (AttributeError, ValueError, OSError):
+        TICK = None
+
+    def __init__(self, pid):
+        super().__init__()
+
+        self._path = f"/proc/{pid}/"
+
+    def get_cpu_time(self):
+        """Returns the CPU time used by the process so far, in
+        nanoseconds, or None if it cannot be read.
+        """
+
+        if (ResourceUsage.TICK is None):
+            return None
+
+        try:
+            with open(self._path + "stat", "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        # the command name may contain spaces, so count the fields from
+        # the bracket that ends it: utime, stime, cutime and cstime are
+        # fields 14 to 17
+        fields = data[data.rfind(b")") + 2:].split()
+        ticks = sum(int(field) for field in fields[11:15])
+        return ticks * ResourceUsage.TICK
+
+    def get_peak_memory(self):
+        """Returns the peak resident set size of the process, in bytes, or
+        None if it cannot be read.
+        """
+
+        try:
+            with open(self._path + "status", "rb") as f:
+                for line in f:
+                    if (line.startswith(b"VmHWM:")):
+                        # given in kB
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError):
+            pass
+        return None
+
+    def reset_peak_memory(self):
+        """Sets the peak resident set size back to the current one, so that
+        an agent kept between games reports the peak of each game. Returns
+        False if the kernel does not allow it.
+        """
+
+        try:
+            with open(self._path + "clear_refs", "w") as f:
+                f.write("5")
+            return True
+        except OSError:
+            return False
@@ -18,8 +18,6 @@ class Tile:
         self.y = y
         self.colour = colour
 
-        self.visited = False
-
     def get_x(self):
         return self.x
 
@@ -31,12 +29,3 @@ class Tile:
 
     def get_colour(self):
         return self.colour
-
-    def visit(self):
-        self.visited = True
-
-    def is_visited(self):
-        return self.visited
-
-    def clear_visit(self):
-        self.visited = False
@@ -0,0 +1,123 @@
+class TimeControl():
+    """The time each agent is allowed in a game, in nanoseconds.
+
+    Each agent has a total budget for the whole game. With a Fischer
+    increment, every move the agent completes adds the increment to its
+    budget. A per-move cap, if set, also limits every single move, however
+    much budget is left. Running out of either is a timeout.
+
+    Moves are timed by the wall clock, or with cpu_clock=True by the CPU
+    time the agent uses, which is fairer when many games share a machine.
+    The CPU clock needs /proc (see ResourceUsage); where it is missing,
+    the wall clock is used.
+    """
+
+    # the default: 5 minutes per agent, no increment and no cap
+    TOTAL = 5 * 60 * 10**9
+
+    # the "-fast" preset for quick regression runs: 10 seconds per agent,
+    # plus 100ms added for every move made
+    FAST_TOTAL = 10 * 10**9
+    FAST_INCREMENT = 100 * 10**6
+
+    # suffixes accepted by parse_duration, in nanoseconds
+    UNITS = {
+        "ms": 10**6,
+        "s": 10**9,
+        "m": 60 * 10**9
+    }
+
+    def __init__(
+        self,
+        total=TOTAL,
+        increment=0,
+        move_limit=None,
+        cpu_clock=False
+    ):
+        super().__init__()
+
+        self.total = total
+        self.increment = increment
+        self.move_limit = move_limit  # None for no cap
+        self.cpu_clock = cpu_clock
+
+    def get_budget(self, turns):
+        """Returns an agent's budget for the game after it has completed
+        the given number of moves.
+        """
+
+        return self.total + self.increment * turns
+
+    def get_time_left(self, used, turns):
+        """Returns how long an agent may take over its next move, having
+        used the given time over the given number of moves.
+        """
+
+        time_left = max(self.get_budget(turns) - used, 0)
+        if (self.move_limit is not None):
+            time_left = min(time_left, self.move_limit)
+        return time_left
+
+    def __repr__(self):
+        text = f"{TimeControl.format_duration(self.total)}"
+        if (self.increment > 0):
+            text += f"+{TimeControl.format_duration(self.increment)}"
+        if (self.move_limit is not None):
+            text += f", {TimeControl.format_duration(self.move_limit)}/move"
+        if (self.cpu_clock):
+            text += ", CPU time"
+        return text
+
+    @staticmethod
+    def from_arguments(arguments):
+        """Returns the time control given by the command-line arguments:
+        "time=d" for the total, "increment=d" and "move_time=d" for the
+        per-move cap, where d is read by parse_duration, "-fast" for the
+        fast preset and "-cpu_clock" to time moves by CPU time. Other
+        arguments are ignored. Raises ValueError if one of these is not
+        in valid format.
+        """
+
+        tc = TimeControl()
+        if ("-fast" in arguments):
+            tc.total = TimeControl.FAST_TOTAL
+            tc.increment = TimeControl.FAST_INCREMENT
+        tc.cpu_clock = "-cpu_clock" in arguments
+
+        for argument in arguments:
+            if (argument.startswith("time=")):
+                tc.total = TimeControl.parse_duration(argument[5:])
+            elif (argument.startswith("increment=")):
+                tc.increment = TimeControl.parse_duration(argument[10:])
+            elif (argument.startswith("move_time=")):
+                tc.move_limit = TimeControl.parse_duration(argument[10:])
+
+        if (tc.total <= 0 or tc.increment < 0 or
+                (tc.move_limit is not None and tc.move_limit <= 0)):
+            raise ValueError("Times must be positive.")
+        return tc
+
+    @staticmethod
+    def parse_duration(text):
+        """Returns the duration in nanoseconds given by a number followed
+        by an optional unit: "ms", "s" (the default) or "m". For example,
+        "500ms", "10" and "1.5m". Raises ValueError for anything else.
+        """
+
+        text = text.strip()
+        for unit in ("ms", "s", "m"):
+            if (text.endswith(unit)):
+                return round(
+                    float(text[:-len(unit)]) * TimeControl.UNITS[unit]
+                )
+        return round(float(text) * TimeControl.UNITS["s"])
+
+    @staticmethod
+    def format_duration(ns):
+        """Returns a duration in nanoseconds as text that parse_duration
+        reads back, to millisecond precision.
+        """
+
+        if (ns % 10**9 == 0):
+            return f"{ns // 10**9}s"
+        return f"{round(ns / 10**6)}ms"
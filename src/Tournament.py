@@ -0,0 +1,291 @@
+"""This script runs a round-robin tournament of Hex.
+
+Every pair of agents plays the given number of games. Colours are
+balanced: each agent plays Red in half of the games of its pairings, so
+the results cover both the normal and the -switch order. Games run in
+parallel in a pool of worker processes, one game per worker.
+
+Possible arguments:
+* "agent=name;command" or "a=name;command" specifies one agent, as in
+Hex.py. At least two agents with unique names are needed.
+* "games=n" sets the number of games per pairing (default 2).
+* "board_size=n" or "b=n" sets the board size (default 11).
+* "processes=n" sets the number of parallel games (default: one per
+CPU core).
+* "-bitboard" or "-bb", "-delta" and the time controls of Hex.py
+("time=d", "increment=d", "move_time=d", "-fast" and "-cpu_clock") are
+passed on to every Game.
+* "-session" keeps agents that support it running between games, one
+set per worker process; see AgentPool.
+* "records=path" records every game in a GameStore in the given
+directory, one shard per worker process.
+"""
+import os
+from sys import argv
+from itertools import combinations
+from multiprocessing import Pool
+from multiprocessing.util import Finalize
+
+from Game import Game
+from Match import run_match
+from AgentPool import AgentPool
+from GameStore import GameStore
+from EndState import EndState
+from TimeControl import TimeControl
+
+
+# the agents kept running by this worker process, and where it records
+# its games
+_pool = None
+_store = None
+
+
+def _init_worker(records=None):
+    """Discards everything a worker process prints, and sets up its pool
+    of agents and its game store. The engine reports each game on stdout
+    and stderr, which would clutter the results.
+    """
+
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+
+    global _pool
+    _pool = AgentPool()
+    # ends the sessions when the worker exits
+    Finalize(_pool, _pool.close, exitpriority=10)
+
+    global _store
+    if (records is not None):
+        _store = GameStore(records)
+        Finalize(_store, _store.close, exitpriority=10)
+
+
+def _play(match):
+    """Plays one scheduled match in a worker process and returns its
+    results.
+    """
+
+    red, blue, options = match
+    options = dict(options)
+    if (options.pop('sessions', False)):
+        options['pool'] = _pool
+    options['store'] = _store
+    return run_match(red=red, blue=blue, **options)
+
+
+class Tournament():
+    """Schedules, plays and summarises a round-robin tournament."""
+
+    def __init__(
+        self,
+        agents,
+        games_per_pairing=2,
+        board_size=11,
+        processes=None,
+        records=None,
+        **options
+    ):
+        """agents is a list of dictionaries with the keys 'name' and
+        'run string', like the players of Game. With sessions=True,
+        each worker process keeps agents that support it running between
+        games. If records is a directory, every game is recorded in a
+        GameStore there. Any other keyword arguments are passed on to
+        every Game.
+        """
+
+        names = [agent['name'] for agent in agents]
+        if (len(names) < 2):
+            raise ValueError("A tournament needs at least two agents.")
+        if (len(names) != len(set(names))):
+            raise ValueError("Agent names must be unique.")
+
+        self._agents = agents
+        self._games_per_pairing = games_per_pairing
+        self._processes = processes or os.cpu_count()
+        self._records = records
+        self._options = dict(options, board_size=board_size)
+
+        self._results = []
+
+    def schedule(self):
+        """Returns the list of matches to play as (red, blue, options)
+        tuples. Within a pairing, the agents take turns playing Red.
+        """
+
+        matches = []
+        for a, b in combinations(self._agents, 2):
+            for idx in range(self._games_per_pairing):
+                if (idx % 2 == 0):
+                    matches.append((a, b, self._options))
+                else:
+                    matches.append((b, a, self._options))
+
+        return matches
+
+    def run(self, verbose=False):
+        """Plays all scheduled matches and returns their MatchResults."""
+
+        matches = self.schedule()
+        with Pool(
+            self._processes,
+            initializer=_init_worker,
+            initargs=(self._records,)
+        ) as pool:
+            for idx, result in enumerate(pool.imap_unordered(_play, matches)):
+                self._results.append(result)
+                if (verbose):
+                    print(
+                        f"[{idx+1}/{len(matches)}] " +
+                        f"{EndState.get_text(result.end_state)}: " +
+                        f"{result.winner} won in {result.turns} turns."
+                    )
+
+            # let the workers exit normally, so that they end their
+            # sessions
+            pool.close()
+            pool.join()
+
+        return self._results
+
+    def get_standings(self):
+        """Aggregates the results per agent. Returns a dictionary from
+        agent name to its statistics.
+        """
+
+        standings = {}
+        for agent in self._agents:
+            standings[agent['name']] = {
+                'games': 0,
+                'wins': 0,
+                'wins as red': 0,
+                'games as red': 0,
+                'timeouts': 0,
+                'illegal moves': 0,
+                'turns': 0,
+                'time': 0,
+                # over the games where they could be measured
+                'cpu turns': 0,
+                'cpu time': 0,
+                'peak memory': None
+            }
+
+        for result in self._results:
+            for name, stats in result.players.items():
+                x = standings[name]
+                x['games'] += 1
+                x['turns'] += stats['turns']
+                x['time'] += stats['time']
+
+                if (stats['cpu time'] is not None):
+                    x['cpu turns'] += stats['turns']
+                    x['cpu time'] += stats['cpu time']
+                if (stats['peak memory'] is not None):
+                    x['peak memory'] = max(
+                        x['peak memory'] or 0, stats['peak memory']
+                    )
+
+                if (name == result.red):
+                    x['games as red'] += 1
+
+                if (name == result.winner):
+                    x['wins'] += 1
+                    if (name == result.red):
+                        x['wins as red'] += 1
+                elif (name == result.get_loser()):
+                    # the loser is the one to blame for an early end
+                    if (result.end_state == EndState.TIMEOUT):
+                        x['timeouts'] += 1
+                    elif (result.end_state == EndState.BAD_MOVE):
+                        x['illegal moves'] += 1
+
+        return standings
+
+    def print_table(self):
+        """Prints the standings as a table sorted by win rate."""
+
+        standings = self.get_standings()
+        ranking = sorted(
+            standings.items(),
+            key=lambda item: item[1]['wins'] / max(item[1]['games'], 1),
+            reverse=True
+        )
+
+        width = max([len("Agent")] + [len(name) for name in standings])
+        print(
+            f"{'Agent':<{width}} {'Games':>6} {'Wins':>6} {'Win%':>6} " +
+            f"{'Red W/G':>9} {'T/O':>4} {'Bad':>4} {'Move (s)':>9} " +
+            f"{'CPU (s)':>8} {'Mem (MiB)':>10}"
+        )
+        for name, x in ranking:
+            win_rate = 100 * x['wins'] / max(x['games'], 1)
+            mean_move = Game.ns_to_s(x['time'] / max(x['turns'], 1))
+            # CPU time per move, including any used on the other's turn
+            mean_cpu = "-"
+            if (x['cpu turns'] > 0):
+                mean_cpu = Game.ns_to_s(x['cpu time'] / x['cpu turns'])
+            peak_memory = "-"
+            if (x['peak memory'] is not None):
+                peak_memory = round(x['peak memory'] / 2**20, 1)
+            print(
+                f"{name:<{width}} {x['games']:>6} {x['wins']:>6} " +
+                f"{win_rate:>6.1f} " +
+                f"{x['wins as red']:>4}/{x['games as red']:<4} " +
+                f"{x['timeouts']:>4} {x['illegal moves']:>4} " +
+                f"{mean_move:>9} {mean_cpu:>8} {peak_memory:>10}"
+            )
+
+
+def main():
+    agents = []
+    options = {}
+    games_per_pairing = 2
+    board_size = 11
+    processes = None
+    records = None
+
+    try:
+        for argument in argv[1:]:
+            if (argument.startswith("agent=") or argument.startswith("a=")):
+                name, cmd = argument.split("=", 1)[1].split(";")
+                agents.append({"name": name, "run string": cmd})
+            elif (argument.startswith("games=")):
+                games_per_pairing = int(argument.split("=")[1])
+            elif (argument.startswith("board_size=") or
+                    argument.startswith("b=")):
+                board_size = int(argument.split("=")[1])
+            elif (argument.startswith("processes=")):
+                processes = int(argument.split("=")[1])
+            elif (argument.startswith("records=")):
+                records = argument.split("=", 1)[1]
+            elif (argument in ("-bb", "-bitboard")):
+                options['bitboard'] = True
+            elif (argument == "-delta"):
+                options['delta'] = True
+            elif (argument == "-session"):
+                options['sessions'] = True
+    except Exception:
+        print(f"ERROR: Argument '{argument}' is not in valid format. Aborted.")
+        return
+
+    try:
+        options['time_control'] = TimeControl.from_arguments(argv[1:])
+    except ValueError as e:
+        print(f"ERROR: Time arguments are not in valid format ({e}). Aborted.")
+        return
+
+    try:
+        t = Tournament(
+            agents, games_per_pairing, board_size, processes, records,
+            **options
+        )
+    except ValueError as e:
+        print(f"ERROR: {e} Aborted.")
+        return
+
+    t.run(verbose=True)
+    t.print_table()
+
+
+if __name__ == "__main__":
+    main()
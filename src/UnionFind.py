@@ -0,0 +1,102 @@
+class UnionFind:
+    """A disjoint-set forest over the integers 0..size-1. Used by the board
+    to keep track of connected groups of same-colour tiles as stones are
+    placed.
+    """
+
+    def __init__(self, size):
+        super().__init__()
+
+        self._parent = list(range(size))
+        self._rank = [0] * size
+
+    def find(self, node):
+        """Returns the representative of the set containing node. Uses path
+        halving, so repeated queries stay close to constant time.
+        """
+
+        parent = self._parent
+        while (parent[node] != node):
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+
+        return node
+
+    def union(self, a, b):
+        """Merges the sets containing a and b. Returns True if they were
+        separate sets, False otherwise.
+        """
+
+        a = self.find(a)
+        b = self.find(b)
+        if (a == b):
+            return False
+
+        # union by rank keeps the trees shallow
+        if (self._rank[a] < self._rank[b]):
+            a, b = b, a
+        self._parent[b] = a
+        if (self._rank[a] == self._rank[b]):
+            self._rank[a] += 1
+
+        return True
+
+    def connected(self, a, b):
+        """Returns True if a and b are in the same set."""
+
+        return self.find(a) == self.find(b)
+
+
+class RollbackUnionFind(UnionFind):
+    """A UnionFind whose unions can be undone in reverse order, for boards
+    that take moves back.
+
+    Path halving would redirect nodes past a root that a later undo
+    splits off again, so find does not compress paths here. Union by rank
+    alone keeps every tree within log2(size) levels.
+    """
+
+    def __init__(self, size):
+        super().__init__(size)
+
+        # (child root, whether the parent's rank grew) of every union
+        self._history = []
+
+    def find(self, node):
+        parent = self._parent
+        while (parent[node] != node):
+            node = parent[node]
+
+        return node
+
+    def union(self, a, b):
+        a = self.find(a)
+        b = self.find(b)
+        if (a == b):
+            return False
+
+        if (self._rank[a] < self._rank[b]):
+            a, b = b, a
+        self._parent[b] = a
+        grew = self._rank[a] == self._rank[b]
+        if (grew):
+            self._rank[a] += 1
+        self._history.append((b, grew))
+
+        return True
+
+    def get_checkpoint(self):
+        """Returns a marker of the current state for rollback."""
+
+        return len(self._history)
+
+    def rollback(self, checkpoint):
+        """Undoes every union made since the given checkpoint."""
+
+        history = self._history
+        while (len(history) > checkpoint):
+            b, grew = history.pop()
+            a = self._parent[b]
+            self._parent[b] = b
+            if (grew):
+                self._rank[a] -= 1
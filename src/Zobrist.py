@@ -0,0 +1,89 @@
+from random import Random
+
+from Colour import Colour
+
+
+class Zobrist():
+    """A 64-bit Zobrist key of a Hex position, updated in constant time.
+
+    Every (tile, colour) pair has a random 64-bit number, and the key is
+    the XOR of the numbers of all stones on the board, so placing or
+    removing a stone is one XOR. The pie rule swaps the agents rather
+    than the stones, so a swap only toggles one more number, which tells
+    positions reached with and without a swap apart.
+
+    Hex is symmetric under a 180-degree rotation of the board, which maps
+    tile (x, y) to (n-1-x, n-1-y) and keeps every stone's colour. The key
+    of the rotated position is kept alongside, and the smaller of the two
+    is the canonical key, which is the same for both positions.
+
+    The numbers come from a fixed seed, so keys agree across processes
+    and runs, and can be stored in opening books. The agent helper in
+    agents/Group006/zobrist.py gives the same keys.
+    """
+
+    SEED = 0x486578  # "Hex"
+
+    # the numbers, by board size: a list of [red, blue] pairs, one per
+    # tile x*n + y, and the swap number
+    _tables = {}
+
+    def __init__(self, board_size=11):
+        super().__init__()
+
+        self._board_size = board_size
+        self._tiles, self._swap = Zobrist._get_table(board_size)
+        self._key = 0
+        self._rotated_key = 0
+
+    @staticmethod
+    def _get_table(n):
+        """Returns the numbers for the given board size, generating them on
+        first use.
+        """
+
+        if (n not in Zobrist._tables):
+            rng = Random(Zobrist.SEED + n)
+            tiles = [
+                [rng.getrandbits(64), rng.getrandbits(64)]
+                for _ in range(n * n)
+            ]
+            Zobrist._tables[n] = (tiles, rng.getrandbits(64))
+
+        return Zobrist._tables[n]
+
+    def copy(self):
+        """Returns an independent copy of the key."""
+
+        z = Zobrist.__new__(Zobrist)
+        z.__dict__.update(self.__dict__)
+        return z
+
+    def toggle(self, x, y, colour):
+        """Adds a stone of the given colour to the key, or removes it if it
+        was there. None for colour does nothing.
+        """
+
+        if (colour is None):
+            return
+
+        idx = 0 if colour == Colour.RED else 1
+        n = self._board_size
+        self._key ^= self._tiles[x * n + y][idx]
+        self._rotated_key ^= self._tiles[(n - 1 - x) * n + n - 1 - y][idx]
+
+    def toggle_swap(self):
+        """Records that the pie rule was used, or undoes it."""
+
+        self._key ^= self._swap
+        self._rotated_key ^= self._swap
+
+    def get_key(self):
+        return self._key
+
+    def get_canonical_key(self):
+        """Returns the key shared by the position and its 180-degree
+        rotation.
+        """
+
+        return min(self._key, self._rotated_key)
@@ -0,0 +1,200 @@
+"""A fork server for Python agents with an expensive start-up.
+
+The zygote process imports an agent's module once, then forks a copy of
+itself for every game. The copies share whatever was loaded before the
+fork (imported libraries, network weights) copy-on-write, so starting an
+agent takes milliseconds instead of seconds. This needs os.fork, so it
+only works on Linux and macOS.
+
+A forked agent is selected with a run string of the form
+"fork:<path to python file>:<class name>". The class is instantiated
+once per game with no arguments and its run method is called, as in the
+agent's own script. If the class has a preload static or class method,
+the zygote calls it once before forking, to load anything that is not
+loaded on import. The port to connect to is set as the class's PORT
+attribute and in the HEX_PORT environment variable.
+
+The engine runs this file as a script to start a zygote. It then writes
+one port number per line to the zygote's stdin and reads back the
+process ID of the agent forked for it.
+"""
+import os
+import random
+import signal
+import subprocess
+import sys
+import traceback
+from time import sleep
+from importlib.util import spec_from_file_location, module_from_spec
+from os.path import basename, dirname, realpath, splitext
+
+
+class ForkedProcess():
+    """Stands in for the subprocess.Popen of an agent forked by a zygote.
+
+    The agent is a child of the zygote rather than of the engine, so its
+    exit status is not available; the zygote reaps it, and poll only
+    reports whether it is still running.
+    """
+
+    # how often wait checks whether the agent has exited, in s
+    WAIT_POLL_TIME = 0.01
+
+    def __init__(self, pid):
+        super().__init__()
+
+        self.pid = pid
+        self.returncode = None
+
+    def poll(self):
+        if (self.returncode is None):
+            try:
+                os.kill(self.pid, 0)
+            except ProcessLookupError:
+                self.returncode = 0
+        return self.returncode
+
+    def kill(self):
+        try:
+            os.kill(self.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def wait(self):
+        while (self.poll() is None):
+            sleep(ForkedProcess.WAIT_POLL_TIME)
+        return self.returncode
+
+
+class Zygote():
+    """The engine's handle on one zygote process. Zygotes are started on
+    first use and shared by every game in the engine process with the
+    same run string.
+    """
+
+    PREFIX = "fork:"
+
+    # running zygotes, by run string
+    _zygotes = {}
+
+    def __init__(self, run_s, silent=True):
+        """Starts a zygote for the given run string. If silent=True, all
+        output of the zygote and its agents is thrown out.
+        """
+
+        super().__init__()
+
+        path, class_name = run_s[len(Zygote.PREFIX):].rsplit(":", 1)
+
+        output = None
+        if (silent):
+            output = subprocess.DEVNULL
+
+        self._process = subprocess.Popen(
+            [sys.executable, realpath(__file__), path, class_name],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=output,
+            text=True
+        )
+
+    @staticmethod
+    def is_forked(run_s):
+        """Returns True if the run string selects a forked agent."""
+        return run_s.startswith(Zygote.PREFIX)
+
+    @staticmethod
+    def get(run_s, silent=True):
+        """Returns the zygote for the given run string, starting it if it
+        is not running yet.
+        """
+
+        z = Zygote._zygotes.get(run_s)
+        if (z is None or z._process.poll() is not None):
+            z = Zygote(run_s, silent)
+            Zygote._zygotes[run_s] = z
+        return z
+
+    def fork(self, port):
+        """Forks a new agent that will connect to the given port. Returns
+        its ForkedProcess. Raises OSError if the zygote is not running,
+        for example because the agent could not be imported.
+        """
+
+        try:
+            self._process.stdin.write(f"{port}\n")
+            self._process.stdin.flush()
+            pid = int(self._process.stdout.readline())
+        except (OSError, ValueError):
+            raise OSError("The zygote has exited.")
+
+        return ForkedProcess(pid)
+
+
+def _load(path, class_name):
+    """Imports the agent class from the given file, making its sibling
+    modules importable as when it is run as a script.
+    """
+
+    path = realpath(path)
+    sys.path.insert(0, dirname(path))
+
+    spec = spec_from_file_location(splitext(basename(path))[0], path)
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return getattr(module, class_name)
+
+
+def _run_agent(cls, port):
+    """Runs one game of the agent in a freshly forked child."""
+
+    os.environ["HEX_PORT"] = str(port)
+    cls.PORT = port
+
+    # forked children would otherwise all draw the same random numbers
+    random.seed()
+    if ("numpy" in sys.modules):
+        sys.modules["numpy"].random.seed()
+    if ("torch" in sys.modules):
+        sys.modules["torch"].seed()
+
+    cls().run()
+
+
+def main():
+    path, class_name = sys.argv[1:3]
+
+    # stdout is kept for replies to the engine; anything printed by the
+    # agent goes to stderr instead
+    replies = os.fdopen(os.dup(1), "w")
+    os.dup2(2, 1)
+
+    cls = _load(path, class_name)
+    if (hasattr(cls, "preload")):
+        cls.preload()
+
+    # let the kernel reap the agents as they exit
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+    for line in sys.stdin:
+        port = int(line)
+        pid = os.fork()
+        if (pid == 0):
+            code = 0
+            try:
+                sys.stdin.close()
+                replies.close()
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                _run_agent(cls, port)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                sys.stdout.flush()
+                os._exit(code)
+
+        replies.write(f"{pid}\n")
+        replies.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,14 +2,22 @@
 
 This is effectively what starts the game. This script may work when run
 directly, with the same specification as Hex.py, but it is not recommended.
+Hex.py calls main in its own process; scripts that play many games should
+use run_match from Match.py instead.
 """
 from sys import argv, platform
 from os.path import realpath, sep
 
-from Game import Game
+from Protocol import Protocol
+from Match import run_match
+from TimeControl import TimeControl
 
 
-def main():
+def main(argv=argv):
+    """Plays one game as specified by the command-line arguments and
+    returns its MatchResult, or None if the arguments were invalid.
+    """
+
     verbose = ("-v" in argv or "-verbose" in argv)
     log = ("-l" in argv or "-log" in argv)
     print_protocol = ("-p" in argv or "-print_protocol" in argv)
@@ -17,8 +25,11 @@ def main():
     silent_bots = ("-sb" in argv or "-silent_bots" in argv)
     java_ref_agent = ("-j" in argv or "-java" in argv)
     double = ("-d" in argv or "-double" in argv)
+    bitboard = ("-bb" in argv or "-bitboard" in argv)
+    delta = ("-delta" in argv)
 
     board_size = 11
+    port = Protocol.PORT
     agents = []
 
     for argument in argv:
@@ -35,6 +46,18 @@ def main():
                     "format. Aborted."
                 )
                 return
+        if (argument.startswith("port=")):
+            try:
+                port = int(argument.split("=")[1])
+            except Exception as e:
+                print("ERROR: Port argument is not in valid format. Aborted.")
+                return
+
+    try:
+        time_control = TimeControl.from_arguments(argv)
+    except ValueError as e:
+        print(f"ERROR: Time arguments are not in valid format ({e}). Aborted.")
+        return
 
     if (len(agents) > 2):
         print("ERROR: Too many agents specified. Aborted.")
@@ -95,16 +118,23 @@ def main():
     if ("-switch" in argv or "-s" in argv):
         player1, player2 = player2, player1
 
-    g = Game(
-        board_size=board_size,
-        player1=player1, player2=player2,
-        verbose=verbose,
-        log=log,
-        print_protocol=print_protocol,
-        kill_bots=kill_bots,
-        silent_bots=silent_bots
-    )
-    g.run()
+    try:
+        return run_match(
+            board_size,
+            player1, player2,
+            verbose=verbose,
+            log=log,
+            print_protocol=print_protocol,
+            kill_bots=kill_bots,
+            silent_bots=silent_bots,
+            bitboard=bitboard,
+            delta=delta,
+            port=port,
+            report=True,
+            time_control=time_control
+        )
+    except ValueError as e:
+        print(f"ERROR: {e} Aborted.")
 
 
 if __name__ == "__main__":